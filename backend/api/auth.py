@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
-from models.database import db, User, MattressCredentials
+from models.database import db, User, MattressCredentials, Schedule
 from services.sleepiq_service import sleepiq_service
+from services.circuit_breaker import CircuitOpenError
+from services.scheduler_service import scheduler_service
+from services.schedule_timing import is_valid_timezone, refresh_next_run
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,11 +28,15 @@ def register():
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already exists'}), 400
         
+        if data.get('timezone') is not None and not is_valid_timezone(data['timezone']):
+            return jsonify({'error': 'timezone must be an IANA timezone name such as America/Chicago'}), 400
+        
         # Create new user
         user = User(
             username=data['username'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password'])
+            password_hash=generate_password_hash(data['password']),
+            timezone=data.get('timezone')
         )
         
         db.session.add(user)
@@ -100,6 +107,43 @@ def get_profile():
         logger.error(f"Profile error: {str(e)}")
         return jsonify({'error': 'Failed to get profile'}), 500
 
+@auth_bp.route('/profile', methods=['PUT'])
+@jwt_required()
+def update_profile():
+    """Update current user profile"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        data = request.get_json()
+        
+        if 'timezone' in data and data['timezone'] != user.timezone:
+            if data['timezone'] is not None and not is_valid_timezone(data['timezone']):
+                return jsonify({'error': 'timezone must be an IANA timezone name such as America/Chicago'}), 400
+            user.timezone = data['timezone']
+            
+            # Schedules are in the user's local time, so their next runs move with the timezone
+            for schedule in Schedule.query.filter_by(user_id=user.id, enabled=True):
+                refresh_next_run(schedule, user.timezone)
+        
+        db.session.commit()
+        scheduler_service.schedules_changed()
+        
+        logger.info(f"Updated profile for user {user.username}")
+        
+        return jsonify({
+            'message': 'Profile updated successfully',
+            'user': user.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Update profile error: {str(e)}")
+        return jsonify({'error': 'Failed to update profile'}), 500
+
 @auth_bp.route('/setup-credentials', methods=['POST'])
 @jwt_required()
 def setup_credentials():
@@ -160,6 +204,10 @@ def test_connection():
             'bed_info': bed_status
         })
         
+    except CircuitOpenError as e:
+        logger.warning(f"Test connection refused: {str(e)}")
+        return jsonify({'error': str(e), 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+        
     except Exception as e:
         logger.error(f"Test connection error: {str(e)}")
         return jsonify({'error': f'Connection failed: {str(e)}'}), 400
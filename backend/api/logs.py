@@ -1,13 +1,60 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.database import db, AdjustmentLog
+from models.database import db, AdjustmentLog, AdjustmentDailyStat
+from services.retention_service import log_retention_service
+from sqlalchemy import func, case, or_, and_
 from datetime import datetime, timedelta
+import base64
+import csv
+import io
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 logs_bp = Blueprint('logs', __name__)
 
+EXPORT_COLUMNS = ['id', 'executed_at', 'side', 'firmness', 'status', 'schedule_id', 'sleeper_id', 'error_message']
+EXPORT_BATCH_SIZE = 1000
+MAX_PER_PAGE = 100
+
+def _filtered_logs_query(user_id):
+    """Build the adjustment log query for the side/status/days filters in the request"""
+    side = request.args.get('side')  # 'left' or 'right'
+    status = request.args.get('status')  # 'success', 'failed', 'pending'
+    days = request.args.get('days', 30, type=int)  # Number of days to look back
+    
+    # Build query
+    query = AdjustmentLog.query.filter_by(user_id=user_id)
+    
+    # Filter by side
+    if side and side in ['left', 'right']:
+        query = query.filter_by(side=side)
+    
+    # Filter by status
+    if status and status in ['success', 'failed', 'pending']:
+        query = query.filter_by(status=status)
+    
+    # Filter by date range
+    if days > 0:
+        start_date = datetime.utcnow() - timedelta(days=days)
+        query = query.filter(AdjustmentLog.executed_at >= start_date)
+    
+    return query
+
+def _encode_cursor(log):
+    """Opaque cursor pointing just past a log in (executed_at, id) order"""
+    position = json.dumps([log.executed_at.isoformat(), log.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode a cursor into (executed_at, id), raising ValueError if it is malformed"""
+    try:
+        executed_at, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(executed_at), int(log_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
 @logs_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_logs():
@@ -17,26 +64,13 @@ def get_logs():
         
         # Get query parameters
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        side = request.args.get('side')  # 'left' or 'right'
-        status = request.args.get('status')  # 'success', 'failed', 'pending'
-        days = request.args.get('days', 30, type=int)  # Number of days to look back
-        
-        # Build query
-        query = AdjustmentLog.query.filter_by(user_id=user_id)
-        
-        # Filter by side
-        if side and side in ['left', 'right']:
-            query = query.filter_by(side=side)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PER_PAGE)
+        cursor = request.args.get('cursor')  # Present (even empty) to use cursor pagination
         
-        # Filter by status
-        if status and status in ['success', 'failed', 'pending']:
-            query = query.filter_by(status=status)
+        query = _filtered_logs_query(user_id)
         
-        # Filter by date range
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            query = query.filter(AdjustmentLog.executed_at >= start_date)
+        if cursor is not None:
+            return _get_logs_after_cursor(query, cursor, per_page)
         
         # Order by most recent first
         query = query.order_by(AdjustmentLog.executed_at.desc())
@@ -64,6 +98,37 @@ def get_logs():
         logger.error(f"Get logs error: {str(e)}")
         return jsonify({'error': 'Failed to get logs'}), 500
 
+def _get_logs_after_cursor(query, cursor, per_page):
+    """Keyset pagination on (executed_at, id), without OFFSET or a total count"""
+    if cursor:
+        try:
+            executed_at, log_id = _decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = query.filter(or_(
+            AdjustmentLog.executed_at < executed_at,
+            and_(AdjustmentLog.executed_at == executed_at, AdjustmentLog.id < log_id)
+        ))
+    
+    # Fetch one extra row to know whether another page exists
+    logs = query.order_by(
+        AdjustmentLog.executed_at.desc(),
+        AdjustmentLog.id.desc()
+    ).limit(per_page + 1).all()
+    
+    has_next = len(logs) > per_page
+    logs = logs[:per_page]
+    
+    return jsonify({
+        'logs': [log.to_dict() for log in logs],
+        'pagination': {
+            'per_page': per_page,
+            'has_next': has_next,
+            'next_cursor': _encode_cursor(logs[-1]) if has_next else None
+        }
+    })
+
 @logs_bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_log_stats():
@@ -72,31 +137,56 @@ def get_log_stats():
         user_id = get_jwt_identity()
         days = request.args.get('days', 30, type=int)
         
-        # Calculate date range
-        start_date = datetime.utcnow() - timedelta(days=days)
+        # Calculate date range in whole UTC days, today included
+        today = datetime.utcnow().date()
+        start_day = today - timedelta(days=days - 1)
+        
+        # Recent activity (last 7 days)
+        is_recent = AdjustmentDailyStat.day >= today - timedelta(days=6)
         
-        # Get all logs in date range
-        logs = AdjustmentLog.query.filter(
-            AdjustmentLog.user_id == user_id,
-            AdjustmentLog.executed_at >= start_date
+        # Read the daily rollups, at most one row per day for each side and status
+        totals = db.session.query(
+            AdjustmentDailyStat.side,
+            AdjustmentDailyStat.status,
+            func.sum(AdjustmentDailyStat.count),
+            func.sum(case((is_recent, AdjustmentDailyStat.count), else_=0)),
+            func.max(case((is_recent, AdjustmentDailyStat.last_executed_at)))
+        ).filter(
+            AdjustmentDailyStat.user_id == user_id,
+            AdjustmentDailyStat.day >= start_day
+        ).group_by(
+            AdjustmentDailyStat.side,
+            AdjustmentDailyStat.status
         ).all()
         
-        # Calculate statistics
-        total_adjustments = len(logs)
-        successful_adjustments = len([log for log in logs if log.status == 'success'])
-        failed_adjustments = len([log for log in logs if log.status == 'failed'])
+        total_adjustments = 0
+        successful_adjustments = 0
+        failed_adjustments = 0
+        left_adjustments = 0
+        right_adjustments = 0
+        recent_adjustments = 0
+        last_adjustment = None
+        
+        for side, status, count, recent_count, last_executed_at in totals:
+            total_adjustments += count
+            recent_adjustments += recent_count
+            
+            if status == 'success':
+                successful_adjustments += count
+            elif status == 'failed':
+                failed_adjustments += count
+            
+            if side == 'left':
+                left_adjustments += count
+            elif side == 'right':
+                right_adjustments += count
+            
+            if last_executed_at and (last_adjustment is None or last_executed_at > last_adjustment):
+                last_adjustment = last_executed_at
         
         # Success rate
         success_rate = (successful_adjustments / total_adjustments * 100) if total_adjustments > 0 else 0
         
-        # Adjustments by side
-        left_adjustments = len([log for log in logs if log.side == 'left'])
-        right_adjustments = len([log for log in logs if log.side == 'right'])
-        
-        # Recent activity (last 7 days)
-        recent_start = datetime.utcnow() - timedelta(days=7)
-        recent_logs = [log for log in logs if log.executed_at >= recent_start]
-        
         return jsonify({
             'period_days': days,
             'total_adjustments': total_adjustments,
@@ -108,8 +198,8 @@ def get_log_stats():
                 'right': right_adjustments
             },
             'recent_activity': {
-                'last_7_days': len(recent_logs),
-                'last_adjustment': recent_logs[0].executed_at.isoformat() if recent_logs else None
+                'last_7_days': recent_adjustments,
+                'last_adjustment': last_adjustment.isoformat() if last_adjustment else None
             }
         })
         
@@ -117,6 +207,67 @@ def get_log_stats():
         logger.error(f"Get log stats error: {str(e)}")
         return jsonify({'error': 'Failed to get log statistics'}), 500
 
+@logs_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_logs():
+    """Stream adjustment logs as CSV or NDJSON"""
+    try:
+        user_id = get_jwt_identity()
+        export_format = request.args.get('format', 'csv')
+        
+        if export_format not in ['csv', 'ndjson']:
+            return jsonify({'error': 'format must be csv or ndjson'}), 400
+        
+        # Stream rows through a server-side cursor instead of loading them all
+        query = _filtered_logs_query(user_id).order_by(
+            AdjustmentLog.executed_at.desc(),
+            AdjustmentLog.id.desc()
+        ).yield_per(EXPORT_BATCH_SIZE)
+        
+        if export_format == 'csv':
+            rows = _csv_rows(query)
+            mimetype = 'text/csv'
+        else:
+            rows = _ndjson_rows(query)
+            mimetype = 'application/x-ndjson'
+        
+        return Response(
+            stream_with_context(rows),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=adjustment_logs.{export_format}'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Export logs error: {str(e)}")
+        return jsonify({'error': 'Failed to export logs'}), 500
+
+def _csv_rows(query):
+    """Yield CSV text a batch of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    
+    for count, log in enumerate(query, start=1):
+        writer.writerow(log.to_dict())
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+def _ndjson_rows(query):
+    """Yield one JSON document per line, a batch of rows at a time"""
+    lines = []
+    for log in query:
+        lines.append(json.dumps(log.to_dict()))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
 @logs_bp.route('/<int:log_id>', methods=['GET'])
 @jwt_required()
 def get_log(log_id):
@@ -151,19 +302,8 @@ def clear_logs():
         # Calculate cutoff date
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # Count logs to be deleted
-        logs_to_delete = AdjustmentLog.query.filter(
-            AdjustmentLog.user_id == user_id,
-            AdjustmentLog.executed_at < cutoff_date
-        ).count()
-        
-        # Delete old logs
-        deleted_count = AdjustmentLog.query.filter(
-            AdjustmentLog.user_id == user_id,
-            AdjustmentLog.executed_at < cutoff_date
-        ).delete()
-        
-        db.session.commit()
+        # Delete old logs in small batches
+        deleted_count = log_retention_service.delete_older_than(cutoff_date, user_id=user_id)
         
         logger.info(f"Cleared {deleted_count} old logs for user {user_id}")
         
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.database import db, AdjustmentLog
 from services.sleepiq_service import sleepiq_service
+from services.circuit_breaker import CircuitOpenError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +19,10 @@ def get_status():
         
         return jsonify(bed_status)
         
+    except CircuitOpenError as e:
+        logger.warning(f"Get mattress status refused: {str(e)}")
+        return jsonify({'error': str(e), 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+        
     except Exception as e:
         logger.error(f"Get mattress status error: {str(e)}")
         return jsonify({'error': f'Failed to get mattress status: {str(e)}'}), 500
@@ -75,6 +80,10 @@ def adjust_firmness():
         else:
             return jsonify({'error': 'Either specify side and firmness, or left_firmness and right_firmness'}), 400
         
+    except CircuitOpenError as e:
+        logger.warning(f"Adjust firmness refused: {str(e)}")
+        return jsonify({'error': str(e), 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+        
     except Exception as e:
         logger.error(f"Adjust firmness error: {str(e)}")
         return jsonify({'error': f'Failed to adjust firmness: {str(e)}'}), 500
@@ -95,6 +104,10 @@ def test_connection():
             'bed_info': bed_status
         })
         
+    except CircuitOpenError as e:
+        logger.warning(f"Test connection refused: {str(e)}")
+        return jsonify({'error': str(e), 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+        
     except Exception as e:
         logger.error(f"Test connection error: {str(e)}")
         return jsonify({'error': f'Connection test failed: {str(e)}'}), 400
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.database import db, Schedule, Sleeper
+from services.scheduler_service import scheduler_service
+from services.schedule_timing import refresh_next_run
 from datetime import datetime
 import logging
 
@@ -82,7 +84,9 @@ def create_schedule():
         )
         
         db.session.add(schedule)
+        refresh_next_run(schedule)
         db.session.commit()
+        scheduler_service.schedules_changed()
         
         logger.info(f"Created schedule '{schedule.name}' for user {user_id}")
         
@@ -171,7 +175,9 @@ def update_schedule(schedule_id):
             schedule.days_of_week = days_of_week
         
         schedule.updated_at = datetime.utcnow()
+        refresh_next_run(schedule)
         db.session.commit()
+        scheduler_service.schedules_changed()
         
         logger.info(f"Updated schedule '{schedule.name}' for user {user_id}")
         
@@ -222,7 +228,9 @@ def toggle_schedule(schedule_id):
         
         schedule.enabled = not schedule.enabled
         schedule.updated_at = datetime.utcnow()
+        refresh_next_run(schedule)
         db.session.commit()
+        scheduler_service.schedules_changed()
         
         status = 'enabled' if schedule.enabled else 'disabled'
         logger.info(f"{status.capitalize()} schedule '{schedule.name}' for user {user_id}")
@@ -1,6 +1,5 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 import os
@@ -28,13 +27,22 @@ else:
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize extensions
-db = SQLAlchemy(app)
+from models.database import db
+db.init_app(app)
 jwt = JWTManager(app)
 migrate = Migrate(app, db)
+
+# Request latency and database time metrics
+from services.metrics import metrics
+metrics.init_app(app)
+
+# Opt-in query and cProfile instrumentation, see PROFILE_REQUESTS
+from services.profiling import request_profiler
+request_profiler.init_app(app)
 CORS(app, origins=['*'])
 
 # Import models to ensure they're registered with SQLAlchemy
-from models.database import User, MattressCredentials, Sleeper, Schedule, AdjustmentLog
+from models.database import User, MattressCredentials, Sleeper, Schedule, AdjustmentLog, AdjustmentDailyStat, AdjustmentRetry
 
 # Import API routes
 from api.auth import auth_bp
@@ -52,12 +60,59 @@ app.register_blueprint(logs_bp, url_prefix='/api/logs')
 @app.route('/api/health')
 def health_check():
     from datetime import datetime
+    from services.sleepiq_service import sleepiq_service
     return jsonify({
         'status': 'OK',
         'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'sleepiq': {
+            'session_cache': sleepiq_service.get_session_cache_stats(),
+            'rate_limiter': sleepiq_service.get_rate_limiter_stats(),
+            'circuit_breaker': sleepiq_service.get_circuit_breaker_stats()
+        }
     })
 
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.content_type)
+
+# CLI commands
+@app.cli.command('backfill-adjustment-stats')
+def backfill_adjustment_stats():
+    """Rebuild the daily adjustment stats from existing logs"""
+    from services.adjustment_stats import adjustment_stats_service
+    rows = adjustment_stats_service.backfill()
+    print(f"Backfilled {rows} daily adjustment stat rows")
+
+@app.cli.command('upgrade-schema')
+def upgrade_schema():
+    """Add the tables, columns and indexes that db.create_all() won't add to an existing database"""
+    from sqlalchemy import inspect
+    db.create_all()
+    inspector = inspect(db.engine)
+    
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    # Every column added since the first release is nullable, so no default is needed
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                    print(f"Added {table.name}.{column.name}")
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=connection)
+                    print(f"Created index {index.name}")
+            
+            # Schedules no longer index updated_at
+            if table.name == 'schedules' and 'ix_schedules_updated_at' in existing_indexes:
+                connection.exec_driver_sql('DROP INDEX ix_schedules_updated_at')
+                print("Dropped index ix_schedules_updated_at")
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -74,7 +129,7 @@ from services.scheduler_service import start_scheduler
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-        start_scheduler()
+        start_scheduler(app)
     
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
@@ -0,0 +1,315 @@
+"""Benchmarks for the scheduler tick, the adjustment path and the log queries.
+
+Seeds a dedicated database with synthetic users, schedules and adjustment logs, runs the hot
+paths against the local SleepIQ stand-in (tools/fake_sleepiq.py) and prints the timings as JSON:
+
+    python -m benchmarks.run --users 10000 --schedules 100000 --logs 10000000 --output results.json
+    python -m benchmarks.run --reuse --baseline benchmarks/baseline.json
+
+With --baseline, medians slower than the baseline by more than --tolerance are reported as
+regressions and the run exits with status 1. --save-baseline writes the results as the new baseline.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the backend hot paths')
+    parser.add_argument('--database-url', default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'sleepnumber-bench.db')}",
+                        help='Database to seed and benchmark; it is dropped and recreated unless --reuse is given')
+    parser.add_argument('--reuse', action='store_true', help='Keep an already seeded database instead of seeding again')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--schedules', type=int, default=5000)
+    parser.add_argument('--logs', type=int, default=200000, help='Adjustment logs, a tenth of them for one heavy user')
+    parser.add_argument('--due', type=int, default=1000, help='Schedules due in each benchmarked scheduler tick')
+    parser.add_argument('--adjustments', type=int, default=200, help='Manual set_firmness calls to time')
+    parser.add_argument('--runs', type=int, default=5, help='Repetitions of the tick and log query benchmarks')
+    parser.add_argument('--upstream-latency', default='fixed:20', help='Stand-in latency spec, see tools/fake_sleepiq.py')
+    parser.add_argument('--upstream-port', type=int, default=8799)
+    parser.add_argument('--output', help='Write results JSON to this file as well as stdout')
+    parser.add_argument('--baseline', help='Compare against results JSON from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed median slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='Write the results to this file as the new baseline')
+    return parser.parse_args()
+
+def configure(args):
+    """Point the app at the benchmark database and the stand-in, without upstream throttling, before importing it"""
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['SLEEPIQ_BASE_URL'] = f"http://127.0.0.1:{args.upstream_port}"
+    os.environ['SLEEPIQ_RATE_LIMIT'] = '0'
+    os.environ['SLEEPIQ_ACCOUNT_RATE_LIMIT'] = '0'
+    os.environ['SCHEDULER_SPREAD_SECONDS'] = '0'
+    os.environ.setdefault('SLEEPIQ_SESSION_CACHE_SIZE', str(max(args.users, 1000)))
+    # A fixed key so credentials seeded by an earlier run still decrypt with --reuse
+    os.environ['ENCRYPTION_KEY'] = base64.urlsafe_b64encode(b'sleepnumber-benchmark'.ljust(32, b'-')).decode()
+
+def summarize(samples, **extra):
+    """Timing summary in milliseconds"""
+    ms = sorted(sample * 1000 for sample in samples)
+    return dict({
+        'runs': len(ms),
+        'min_ms': round(ms[0], 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        'max_ms': round(ms[-1], 3),
+        'mean_ms': round(statistics.fmean(ms), 3)
+    }, **extra)
+
+def insert_batches(db, table, rows, batch_size=50000):
+    """Bulk insert an iterable of rows in executemany batches"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+
+def seed(args):
+    from models.database import db, User, MattressCredentials, Schedule, AdjustmentLog
+    from services.sleepiq_service import sleepiq_service
+    from services.adjustment_stats import adjustment_stats_service
+    
+    db.drop_all()
+    db.create_all()
+    started = time.monotonic()
+    now = datetime.utcnow()
+    
+    insert_batches(db, User.__table__, (
+        {'id': user_id, 'username': f"bench{user_id}", 'email': f"bench{user_id}@example.com", 'password_hash': 'x'}
+        for user_id in range(1, args.users + 1)
+    ))
+    
+    # Fernet output differs on every call but any valid token decrypts, so encrypt once
+    encrypted_password = sleepiq_service.cipher_suite.encrypt(b'password').decode()
+    insert_batches(db, MattressCredentials.__table__, (
+        {
+            'user_id': user_id,
+            'encrypted_email': sleepiq_service.cipher_suite.encrypt(f"bench{user_id}@example.com".encode()).decode(),
+            'encrypted_password': encrypted_password
+        }
+        for user_id in range(1, args.users + 1)
+    ))
+    
+    # Parked in the future; the tick benchmark makes a slice of them due
+    parked = now + timedelta(days=365)
+    insert_batches(db, Schedule.__table__, (
+        {
+            'id': schedule_id,
+            'user_id': (schedule_id - 1) % args.users + 1,
+            'name': f"Schedule {schedule_id}",
+            'time': f"{random.randrange(24):02d}:{random.randrange(60):02d}",
+            'left_firmness': random.randrange(5, 100, 5),
+            'right_firmness': random.randrange(5, 100, 5),
+            'apply_to_sides': 'both',
+            'enabled': True,
+            'next_run_at': parked
+        }
+        for schedule_id in range(1, args.schedules + 1)
+    ))
+    
+    # User 1 is the heavy user whose logs are paged through; the rest are spread over everyone
+    heavy_logs = args.logs // 10
+    window = timedelta(days=29).total_seconds()
+    insert_batches(db, AdjustmentLog.__table__, (
+        {
+            'user_id': 1 if index < heavy_logs else random.randint(1, args.users),
+            'side': random.choice(('left', 'right')),
+            'firmness': random.randrange(5, 100, 5),
+            'status': 'success' if random.random() < 0.97 else 'failed',
+            'executed_at': now - timedelta(seconds=random.uniform(0, window))
+        }
+        for index in range(args.logs)
+    ))
+    
+    adjustment_stats_service.backfill()
+    db.session.commit()
+    return round(time.monotonic() - started, 3)
+
+def bench_scheduler_tick(args):
+    from models.database import db, Schedule
+    from services.scheduler_service import scheduler_service
+    from services.sleepiq_service import sleepiq_service
+    from services.log_writer import adjustment_log_writer
+    
+    def make_due():
+        due_at = datetime.utcnow().replace(second=0, microsecond=0)
+        db.session.execute(
+            Schedule.__table__.update().where(Schedule.__table__.c.id <= args.due).values(next_run_at=due_at)
+        )
+        db.session.commit()
+    
+    def tick():
+        make_due()
+        started = time.perf_counter()
+        scheduler_service.check_and_execute_schedules()
+        adjustment_log_writer.flush()
+        return time.perf_counter() - started
+    
+    # The first tick logs every user in; later ones find their sessions cached
+    for user_id in range(1, args.users + 1):
+        sleepiq_service.clear_session_cache(user_id)
+    cold = tick()
+    cold_tick = dict(scheduler_service.last_tick)
+    warm = [tick() for _ in range(args.runs)]
+    return {
+        'scheduler_tick_cold': summarize([cold], due=args.due, executed=cold_tick['executed'], failed=cold_tick['failed']),
+        'scheduler_tick': summarize(
+            warm,
+            due=args.due,
+            executed=scheduler_service.last_tick['executed'],
+            failed=scheduler_service.last_tick['failed'],
+            max_start_lag_seconds=scheduler_service.last_tick['max_start_lag_seconds']
+        )
+    }
+
+def bench_set_firmness(args):
+    from services.sleepiq_service import sleepiq_service
+    
+    samples = []
+    failures = 0
+    for index in range(args.adjustments):
+        user_id = index % args.users + 1
+        started = time.perf_counter()
+        result = sleepiq_service.set_firmness(user_id, 'left', random.randrange(5, 100, 5))
+        samples.append(time.perf_counter() - started)
+        failures += not result['success']
+    return {'set_firmness': summarize(samples, failed=failures)}
+
+def bench_log_queries(args, app):
+    from flask_jwt_extended import create_access_token
+    from models.database import AdjustmentLog
+    from api.logs import _encode_cursor
+    
+    with app.app_context():
+        headers = {'Authorization': f"Bearer {create_access_token(identity='1')}"}
+        # The log 90% of the way down the heavy user's history, for deep cursor pages
+        total = AdjustmentLog.query.filter_by(user_id=1).count()
+        deep_log = AdjustmentLog.query.filter_by(user_id=1).order_by(
+            AdjustmentLog.executed_at.desc(), AdjustmentLog.id.desc()
+        ).offset(int(total * 0.9)).first()
+        deep_cursor = _encode_cursor(deep_log) if deep_log else ''
+    
+    client = app.test_client()
+    per_page = 50
+    deep_page = max(1, int(total * 0.9) // per_page)
+    
+    def timed(url):
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return samples
+    
+    return {
+        'get_logs_first_page': summarize(timed(f"/api/logs/?per_page={per_page}"), user_logs=total),
+        'get_logs_deep_page': summarize(timed(f"/api/logs/?per_page={per_page}&page={deep_page}"), page=deep_page),
+        'get_logs_deep_cursor': summarize(timed(f"/api/logs/?per_page={per_page}&cursor={deep_cursor}")),
+        'get_log_stats': summarize(timed('/api/logs/stats?days=30'))
+    }
+
+def compare(results, baseline, tolerance):
+    """Median changes against a baseline, as (report rows, regressed benchmark names)"""
+    report = []
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or not previous.get('median_ms'):
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        regressed = ratio > 1 + tolerance
+        report.append({
+            'benchmark': name,
+            'baseline_median_ms': previous['median_ms'],
+            'median_ms': current['median_ms'],
+            'change': f"{(ratio - 1) * 100:+.1f}%",
+            'regressed': regressed
+        })
+        if regressed:
+            regressions.append(name)
+    return report, regressions
+
+def main():
+    args = parse_args()
+    configure(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    
+    from app import app
+    from models.database import db, User, SchedulerLease
+    from services.sleepiq_service import sleepiq_service
+    from services.scheduler_service import scheduler_service
+    from services.log_writer import adjustment_log_writer
+    from tools.fake_sleepiq import FakeConfig, Latency, start_server
+    from sqlalchemy import inspect
+    
+    # Background work runs outside requests, so give it the app context the scheduler normally would
+    scheduler_service.app = app
+    adjustment_log_writer.app = app
+    _, runner = sleepiq_service.run(start_server(
+        FakeConfig(latency=Latency(args.upstream_latency)),
+        port=args.upstream_port
+    ))
+    
+    try:
+        with app.app_context():
+            seed_seconds = None
+            database = db.engine.url.get_backend_name()
+            if not (args.reuse and inspect(db.engine).has_table(User.__tablename__) and User.query.first()):
+                seed_seconds = seed(args)
+            
+            # Take over the dispatcher lease from any earlier run that did not release it
+            SchedulerLease.query.delete()
+            db.session.commit()
+            
+            results = {}
+            results.update(bench_scheduler_tick(args))
+            results.update(bench_set_firmness(args))
+        results.update(bench_log_queries(args, app))
+    finally:
+        sleepiq_service.run(runner.cleanup())
+    
+    output = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database,
+            'scale': {'users': args.users, 'schedules': args.schedules, 'logs': args.logs, 'due': args.due},
+            'upstream_latency': args.upstream_latency,
+            'seed_seconds': seed_seconds
+        },
+        'results': results
+    }
+    
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report, regressions = compare(results, json.load(f), args.tolerance)
+        output['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance, 'benchmarks': report}
+        if regressions:
+            print(f"Regressions against {args.baseline}: {', '.join(regressions)}", file=sys.stderr)
+            exit_code = 1
+    
+    text = json.dumps(output, indent=2)
+    print(text)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
+    timezone = db.Column(db.String(64), nullable=True)  # IANA name, e.g. "America/Chicago"; DEFAULT_TIMEZONE when unset
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -26,6 +27,7 @@ class User(db.Model):
             'id': self.id,
             'username': self.username,
             'email': self.email,
+            'timezone': self.timezone,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -88,6 +90,7 @@ class Schedule(db.Model):
     apply_to_sides = db.Column(db.String(10), nullable=False, default='both')  # 'left', 'right', 'both'
     enabled = db.Column(db.Boolean, default=True)
     days_of_week = db.Column(JSON, nullable=True)  # List of days: [0,1,2,3,4,5,6] (0=Monday)
+    next_run_at = db.Column(db.DateTime, nullable=True, index=True)  # UTC; None while disabled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -106,23 +109,16 @@ class Schedule(db.Model):
             'apply_to_sides': self.apply_to_sides,
             'enabled': self.enabled,
             'days_of_week': self.days_of_week,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
-    
-    def should_run_today(self):
-        """Check if this schedule should run today"""
-        if not self.enabled:
-            return False
-        
-        if not self.days_of_week:
-            return True  # Run every day if no days specified
-        
-        today = datetime.now().weekday()  # 0=Monday, 6=Sunday
-        return today in self.days_of_week
 
 class AdjustmentLog(db.Model):
     __tablename__ = 'adjustment_logs'
+    __table_args__ = (
+        db.Index('ix_adjustment_logs_user_executed_at', 'user_id', 'executed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -146,3 +142,70 @@ class AdjustmentLog(db.Model):
             'error_message': self.error_message,
             'executed_at': self.executed_at.isoformat() if self.executed_at else None
         }
+
+class AdjustmentRetry(db.Model):
+    __tablename__ = 'adjustment_retries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    log_id = db.Column(db.Integer, db.ForeignKey('adjustment_logs.id', ondelete='CASCADE'), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    side = db.Column(db.String(10), nullable=False)  # 'left' or 'right'
+    firmness = db.Column(db.Integer, nullable=False)  # 0-100
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)  # Past this the adjustment is too stale to apply
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    log = db.relationship('AdjustmentLog')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'log_id': self.log_id,
+            'user_id': self.user_id,
+            'side': self.side,
+            'firmness': self.firmness,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class AdjustmentDailyStat(db.Model):
+    __tablename__ = 'adjustment_daily_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC day of executed_at
+    side = db.Column(db.String(10), primary_key=True)  # 'left' or 'right'
+    status = db.Column(db.String(20), primary_key=True)  # 'success', 'failed', 'pending'
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_executed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'day': self.day.isoformat() if self.day else None,
+            'side': self.side,
+            'status': self.status,
+            'count': self.count,
+            'last_executed_at': self.last_executed_at.isoformat() if self.last_executed_at else None
+        }
+
+class SchedulerLease(db.Model):
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
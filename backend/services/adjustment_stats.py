@@ -0,0 +1,98 @@
+from models.database import db, AdjustmentLog, AdjustmentDailyStat
+from sqlalchemy import func, case, insert
+from sqlalchemy.dialects import postgresql, sqlite
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_KEY = ('user_id', 'day', 'side', 'status')
+
+class AdjustmentStatsService:
+    """Maintains the per-day adjustment counts behind /api/logs/stats"""
+    
+    def _rollup(self, rows, delta):
+        """Group log rows into per (user, day, side, status) count changes"""
+        counts = {}
+        for row in rows:
+            key = (row['user_id'], row['executed_at'].date(), row['side'], row['status'])
+            count, last_executed_at = counts.get(key, (0, None))
+            if last_executed_at is None or row['executed_at'] > last_executed_at:
+                last_executed_at = row['executed_at']
+            counts[key] = (count + delta, last_executed_at)
+        
+        return [
+            dict(zip(ROLLUP_KEY, key), count=count, last_executed_at=last_executed_at)
+            for key, (count, last_executed_at) in counts.items()
+        ]
+    
+    def record(self, rows, delta=1):
+        """Add log rows to the daily counts in the caller's transaction"""
+        values = self._rollup(rows, delta)
+        if not values:
+            return
+        
+        table = AdjustmentDailyStat.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            stmt = postgresql.insert(table)
+        elif dialect == 'sqlite':
+            stmt = sqlite.insert(table)
+        else:
+            self._record_without_upsert(values)
+            return
+        
+        excluded = stmt.excluded
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(ROLLUP_KEY),
+                set_={
+                    'count': table.c.count + excluded.count,
+                    'last_executed_at': case(
+                        (excluded.last_executed_at > table.c.last_executed_at, excluded.last_executed_at),
+                        else_=table.c.last_executed_at
+                    )
+                }
+            ),
+            values
+        )
+    
+    def _record_without_upsert(self, values):
+        """Update-then-insert for databases without ON CONFLICT support"""
+        for value in values:
+            stat = AdjustmentDailyStat.query.get(tuple(value[key] for key in ROLLUP_KEY))
+            if stat is None:
+                db.session.add(AdjustmentDailyStat(**value))
+                continue
+            stat.count += value['count']
+            if stat.last_executed_at is None or value['last_executed_at'] > stat.last_executed_at:
+                stat.last_executed_at = value['last_executed_at']
+    
+    def backfill(self):
+        """Rebuild all daily counts from the adjustment_logs table"""
+        # Run with the scheduler stopped, since logs written during the rebuild may be missed
+        db.session.query(AdjustmentDailyStat).delete(synchronize_session=False)
+        
+        day = func.date(AdjustmentLog.executed_at)
+        totals = db.session.query(
+            AdjustmentLog.user_id,
+            day,
+            AdjustmentLog.side,
+            AdjustmentLog.status,
+            func.count(AdjustmentLog.id),
+            func.max(AdjustmentLog.executed_at)
+        ).group_by(AdjustmentLog.user_id, day, AdjustmentLog.side, AdjustmentLog.status)
+        
+        db.session.execute(
+            insert(AdjustmentDailyStat.__table__).from_select(
+                list(ROLLUP_KEY) + ['count', 'last_executed_at'],
+                totals
+            )
+        )
+        db.session.commit()
+        
+        rows = db.session.query(func.count()).select_from(AdjustmentDailyStat).scalar()
+        logger.info(f"Backfilled {rows} daily adjustment stat rows")
+        return rows
+
+# Global service instance
+adjustment_stats_service = AdjustmentStatsService()
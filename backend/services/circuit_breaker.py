@@ -0,0 +1,122 @@
+from collections import deque
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that the circuit breaker considers down"""
+    
+    def __init__(self, name, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{name} is temporarily unavailable, retry in {self.retry_after}s")
+
+class CircuitBreaker:
+    """Stops calls to an upstream whose recent error rate is too high, probing it again after a cool-down.
+    
+    Only updated from the client event loop, so no locking is needed.
+    """
+    
+    def __init__(self, name, failure_rate=0.5, min_requests=10, window_seconds=60, open_seconds=30, probe_requests=3):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_requests = probe_requests
+        self.state = CLOSED
+        self.outcomes = deque()  # (monotonic time, failed) within the window
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0  # probe requests let through while half open
+        self.probe_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+    
+    def _retry_after(self, now):
+        return max(0.0, self.opened_at + self.open_seconds - now)
+    
+    def check(self):
+        """Raise CircuitOpenError if calls are currently refused, without taking a probe slot"""
+        now = time.monotonic()
+        if self.state == OPEN and self._retry_after(now) > 0:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self._retry_after(now))
+    
+    def before_request(self):
+        """Let a request through or raise CircuitOpenError"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if self._retry_after(now) > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self._retry_after(now))
+            self.state = HALF_OPEN
+            self.probes = 0
+            self.probe_successes = 0
+            logger.info(f"Circuit for {self.name} half open, probing")
+        
+        if self.state == HALF_OPEN:
+            if self.probes >= self.probe_requests:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self.probes += 1
+    
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self.probe_successes += 1
+            if self.probe_successes >= self.probe_requests:
+                self._close()
+            return
+        self._record(False)
+    
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._record(True)
+        
+        total = len(self.outcomes)
+        if self.state == CLOSED and total >= self.min_requests and self.failures / total >= self.failure_rate:
+            self._open()
+    
+    def _record(self, failed):
+        now = time.monotonic()
+        self.outcomes.append((now, failed))
+        self.failures += failed
+        cutoff = now - self.window_seconds
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            _, old_failed = self.outcomes.popleft()
+            self.failures -= old_failed
+    
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(f"Circuit for {self.name} opened, refusing calls for {self.open_seconds}s")
+    
+    def _close(self):
+        self.state = CLOSED
+        self.outcomes.clear()
+        self.failures = 0
+        logger.info(f"Circuit for {self.name} closed")
+    
+    def is_open(self):
+        """Whether calls are currently refused outright"""
+        return self.state == OPEN and self._retry_after(time.monotonic()) > 0
+    
+    def stats(self):
+        """Get breaker state and recent error rate"""
+        total = len(self.outcomes)
+        return {
+            'state': self.state,
+            'recent_requests': total,
+            'recent_failure_rate': round(self.failures / total, 3) if total else 0.0,
+            'retry_after_seconds': round(self._retry_after(time.monotonic()), 1) if self.state == OPEN else None,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
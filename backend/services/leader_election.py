@@ -0,0 +1,78 @@
+from models.database import db, SchedulerLease
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import os
+import socket
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LeaderLease:
+    """A named lease in the database that at most one process holds at a time"""
+    
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl if ttl is not None else float(os.environ.get('SCHEDULER_LEASE_TTL', 30))
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+    
+    def try_acquire(self):
+        """Take or renew the lease if it is free, expired or already ours; returns whether we hold it"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        
+        try:
+            updated = SchedulerLease.query.filter(
+                SchedulerLease.name == self.name,
+                or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+            ).update({'holder': self.holder, 'expires_at': expires_at}, synchronize_session=False)
+            
+            if not updated and db.session.get(SchedulerLease, self.name) is None:
+                db.session.add(SchedulerLease(name=self.name, holder=self.holder, expires_at=expires_at))
+                updated = 1
+            
+            db.session.commit()
+            acquired = bool(updated)
+        except IntegrityError:
+            # Another process created the lease first
+            db.session.rollback()
+            acquired = False
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to renew lease '{self.name}': {str(e)}")
+            acquired = False
+        
+        if acquired != self.is_leader:
+            if acquired:
+                logger.info(f"Acquired lease '{self.name}' as {self.holder}")
+            else:
+                logger.warning(f"Lost lease '{self.name}'")
+        self.is_leader = acquired
+        return acquired
+    
+    def release(self):
+        """Give up the lease so another process can take over immediately"""
+        if not self.is_leader:
+            return
+        
+        try:
+            SchedulerLease.query.filter_by(name=self.name, holder=self.holder).update(
+                {'expires_at': datetime.utcnow() - timedelta(seconds=1)},
+                synchronize_session=False
+            )
+            db.session.commit()
+            logger.info(f"Released lease '{self.name}'")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to release lease '{self.name}': {str(e)}")
+        self.is_leader = False
+    
+    def status(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'is_leader': self.is_leader,
+            'ttl_seconds': self.ttl
+        }
@@ -0,0 +1,133 @@
+from models.database import db, AdjustmentLog
+from services.adjustment_stats import adjustment_stats_service
+from services.metrics import metrics
+from contextlib import nullcontext
+from datetime import datetime
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOG_COLUMNS = ('user_id', 'schedule_id', 'sleeper_id', 'side', 'firmness', 'status', 'error_message', 'executed_at')
+
+class AdjustmentLogWriter:
+    """Writes AdjustmentLog rows, either immediately or buffered and bulk inserted in the background"""
+    
+    def __init__(self):
+        self.batch_size = int(os.environ.get('LOG_BUFFER_SIZE', 500))
+        self.flush_interval = float(os.environ.get('LOG_FLUSH_INTERVAL', 2))
+        self.max_pending = int(os.environ.get('LOG_BUFFER_MAX_PENDING', 50000))
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.app = None
+    
+    def _row(self, entry):
+        row = dict.fromkeys(LOG_COLUMNS)
+        row['executed_at'] = datetime.utcnow()
+        row.update(entry)
+        return row
+    
+    def _app_context(self):
+        return self.app.app_context() if self.app else nullcontext()
+    
+    def start(self, app=None):
+        """Start the background flush thread"""
+        if self.thread is not None:
+            return
+        
+        self.app = app
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name='adjustment-log-writer', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop the flush thread and write any pending rows"""
+        if self.thread is not None:
+            self.stopping = True
+            self.wakeup.set()
+            self.thread.join(timeout=30)
+            self.thread = None
+        self.flush()
+    
+    def _run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+    
+    def write(self, entries, commit=True):
+        """Insert log entries now in one transaction and return the AdjustmentLog objects"""
+        rows = [self._row(entry) for entry in entries]
+        logs = [AdjustmentLog(**row) for row in rows]
+        db.session.add_all(logs)
+        adjustment_stats_service.record(rows)
+        if commit:
+            db.session.commit()
+            metrics.count_adjustments(rows)
+        else:
+            # Leave the transaction open for the caller but assign ids now; the caller counts what it commits
+            db.session.flush()
+        return logs
+    
+    def add(self, entries):
+        """Buffer log entries for the next bulk insert"""
+        rows = [self._row(entry) for entry in entries]
+        if not rows:
+            return
+        
+        with self.lock:
+            self.buffer.extend(rows)
+            pending = len(self.buffer)
+        
+        if self.thread is None:
+            # Nothing will flush in the background, so write through
+            self.flush()
+        elif pending >= self.batch_size:
+            self.wakeup.set()
+    
+    def flush(self):
+        """Bulk insert all buffered rows, returning how many were written"""
+        with self.flush_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if not rows:
+                return 0
+            
+            written = 0
+            with self._app_context():
+                try:
+                    for start in range(0, len(rows), self.batch_size):
+                        batch = rows[start:start + self.batch_size]
+                        db.session.execute(AdjustmentLog.__table__.insert(), batch)
+                        adjustment_stats_service.record(batch)
+                        db.session.commit()
+                        metrics.count_adjustments(batch)
+                        written = start + self.batch_size
+                except Exception as e:
+                    db.session.rollback()
+                    self._requeue(rows[written:])
+                    logger.error(f"Failed to flush {len(rows) - written} adjustment logs: {str(e)}")
+            
+            return min(written, len(rows))
+    
+    def _requeue(self, rows):
+        """Put unwritten rows back for the next flush, dropping the oldest past max_pending"""
+        with self.lock:
+            self.buffer = rows + self.buffer
+            overflow = len(self.buffer) - self.max_pending
+            if overflow > 0:
+                del self.buffer[:overflow]
+                logger.error(f"Adjustment log buffer full, dropped {overflow} oldest rows")
+    
+    def pending(self):
+        """Number of rows waiting to be flushed"""
+        with self.lock:
+            return len(self.buffer)
+
+# Global writer instance
+adjustment_log_writer = AdjustmentLogWriter()
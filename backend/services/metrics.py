@@ -0,0 +1,97 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TICK_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 120)
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 15, 30, 45, 60, 120, 300, 900)
+
+class Metrics:
+    """Prometheus metrics for API requests, SleepIQ calls, the scheduler and adjustments.
+    
+    Kept in memory per process; each worker serves its own /metrics.
+    """
+    
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.content_type = CONTENT_TYPE_LATEST
+        
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'API request latency by route',
+            ['method', 'route', 'status'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.request_db_duration = Histogram(
+            'http_request_db_seconds', 'Database time spent in each API request',
+            ['route'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.upstream_duration = Histogram(
+            'sleepiq_request_duration_seconds', 'SleepIQ API call latency by endpoint and response status',
+            ['endpoint', 'status'], buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.tick_duration = Histogram(
+            'scheduler_tick_duration_seconds', 'Time to dispatch all schedules due in a tick',
+            buckets=TICK_BUCKETS, registry=self.registry
+        )
+        self.start_lag = Histogram(
+            'scheduler_start_lag_seconds', 'How long after its scheduled time each schedule started',
+            buckets=LAG_BUCKETS, registry=self.registry
+        )
+        self.adjustments = Counter(
+            'adjustments', 'Committed final adjustment outcomes by source and status',
+            ['source', 'status'], registry=self.registry
+        )
+        self.session_cache_size = Gauge(
+            'sleepiq_session_cache_size', 'Cached SleepIQ sessions', registry=self.registry
+        )
+        self.circuit_open = Gauge(
+            'sleepiq_circuit_open', 'Whether the SleepIQ circuit breaker is refusing calls', registry=self.registry
+        )
+    
+    def init_app(self, app):
+        """Time every request and the database work done inside it"""
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_db_seconds = 0.0
+    
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.request_duration.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+            self.request_db_duration.labels(route).observe(g.pop('metrics_db_seconds', 0.0))
+        return response
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.metrics_query_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Queries from the scheduler and other background threads have no request to add to
+        if has_request_context() and 'metrics_db_seconds' in g:
+            g.metrics_db_seconds += time.perf_counter() - context.metrics_query_started
+    
+    def count_adjustments(self, rows, source=None):
+        """Count committed adjustment rows; the source defaults to scheduled or manual by schedule_id.
+        
+        Pending rows are skipped, since the retry queue counts them once they reach a final status.
+        """
+        for row in rows:
+            if row['status'] == 'pending':
+                continue
+            row_source = source or ('scheduled' if row.get('schedule_id') else 'manual')
+            self.adjustments.labels(row_source, row['status']).inc()
+    
+    def render(self):
+        """Current metrics in the Prometheus text format"""
+        return generate_latest(self.registry)
+
+# Global metrics instance
+metrics = Metrics()
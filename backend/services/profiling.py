@@ -0,0 +1,127 @@
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import cProfile
+import heapq
+import os
+import random
+import tempfile
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RequestProfiler:
+    """Opt-in per-request query counts, DB time, slow statement logging and sampled cProfile dumps.
+    
+    Nothing is registered unless PROFILE_REQUESTS is enabled, so it costs nothing when off.
+    """
+    
+    def __init__(self):
+        self.enabled = os.environ.get('PROFILE_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+        self.slow_query_seconds = float(os.environ.get('PROFILE_SLOW_QUERY_MS', 100)) / 1000
+        self.slow_request_seconds = float(os.environ.get('PROFILE_SLOW_REQUEST_MS', 500)) / 1000
+        self.top_queries = int(os.environ.get('PROFILE_TOP_QUERIES', 5))
+        self.sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+        self.profile_dir = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'sleepnumber-profiles')
+    
+    def init_app(self, app):
+        """Register the request hooks and engine events when profiling is enabled"""
+        if not self.enabled:
+            return
+        
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        if self.sample_rate > 0:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        logger.info(
+            f"Request profiling enabled (slow queries >= {self.slow_query_seconds * 1000:.0f} ms, "
+            f"slow requests >= {self.slow_request_seconds * 1000:.0f} ms, cProfile sample rate {self.sample_rate})"
+        )
+    
+    def _start_request(self):
+        g.profile_started = time.perf_counter()
+        g.profile_queries = 0
+        g.profile_db_seconds = 0.0
+        g.profile_slowest = []  # min-heap of (seconds, sequence, statement), the slowest top_queries kept
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            g.profile_cprofile = cProfile.Profile()
+            g.profile_cprofile.enable()
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.profile_query_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.profile_query_started
+        in_request = has_request_context() and 'profile_started' in g
+        
+        if elapsed >= self.slow_query_seconds:
+            where = f"{request.method} {request.path}" if in_request else 'background work'
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {where}: {statement}")
+        
+        if in_request:
+            g.profile_queries += 1
+            g.profile_db_seconds += elapsed
+            entry = (elapsed, g.profile_queries, statement)
+            if len(g.profile_slowest) < self.top_queries:
+                heapq.heappush(g.profile_slowest, entry)
+            elif self.top_queries > 0:
+                heapq.heappushpop(g.profile_slowest, entry)
+    
+    def _finish_request(self, response):
+        started = g.get('profile_started')
+        if started is None:
+            return response
+        
+        elapsed = time.perf_counter() - started
+        dump = self._save_profile()
+        
+        # Visible in browser dev tools next to the request timing
+        response.headers['Server-Timing'] = (
+            f'db;dur={g.profile_db_seconds * 1000:.1f};desc="{g.profile_queries} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        
+        summary = (
+            f"{request.method} {request.path} -> {response.status_code} in {elapsed * 1000:.1f} ms, "
+            f"{g.profile_queries} queries, {g.profile_db_seconds * 1000:.1f} ms in the database"
+        )
+        if dump:
+            summary += f", profile saved to {dump}"
+        
+        if elapsed >= self.slow_request_seconds:
+            slowest = sorted(g.profile_slowest, reverse=True)
+            details = ''.join(f"\n  {seconds * 1000:.1f} ms: {statement}" for seconds, _, statement in slowest)
+            logger.warning(f"Slow request: {summary}{details}")
+        else:
+            logger.debug(summary)
+        return response
+    
+    def _save_profile(self):
+        """Stop a sampled request's profiler and write its stats, returning the file path"""
+        profiler = g.pop('profile_cprofile', None)
+        if profiler is None:
+            return None
+        
+        profiler.disable()
+        endpoint = (request.endpoint or 'unmatched').replace('.', '-')
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{os.getpid()}-{random.randrange(10 ** 6):06d}.prof"
+        path = os.path.join(self.profile_dir, name)
+        try:
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.error(f"Failed to save request profile: {str(e)}")
+            return None
+        return path
+    
+    def _teardown_request(self, error=None):
+        # A request that failed before after_request still has to stop its profiler
+        profiler = g.pop('profile_cprofile', None)
+        if profiler is not None:
+            profiler.disable()
+
+# Global profiler instance
+request_profiler = RequestProfiler()
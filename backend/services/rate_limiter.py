@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than the limiter allows"""
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `burst`"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, now):
+        """Take a token, going into debt if none are left, and return the seconds to wait for it"""
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+    
+    def cancel(self):
+        """Give back a reserved token that will not be used"""
+        self.tokens += 1
+    
+    def idle(self, now):
+        """Whether the bucket has refilled completely, so dropping it loses nothing"""
+        self._refill(now)
+        return self.tokens >= self.burst
+
+class RateLimiter:
+    """Global and per-account token buckets in front of every upstream request.
+    
+    Only used from the client event loop, so no locking is needed.
+    """
+    
+    PRUNE_EVERY = 1000
+    
+    def __init__(self, rate, burst, account_rate, account_burst, max_wait):
+        self.rate = rate
+        self.burst = burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.accounts = {}  # account -> TokenBucket
+        self.requests = 0
+        self.priority_requests = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_waited = 0.0
+    
+    def _account_bucket(self, account, now):
+        if self.account_rate <= 0 or account is None:
+            return None
+        
+        bucket = self.accounts.get(account)
+        if bucket is None:
+            bucket = self.accounts[account] = TokenBucket(self.account_rate, self.account_burst)
+        
+        # Buckets that refilled completely behave like new ones, so drop them now and then
+        if self.requests % self.PRUNE_EVERY == 0:
+            for key in [key for key, other in self.accounts.items() if other is not bucket and other.idle(now)]:
+                del self.accounts[key]
+        return bucket
+    
+    async def _wait_for(self, bucket):
+        wait = bucket.reserve(time.monotonic())
+        if wait > self.max_wait:
+            bucket.cancel()
+            self.rejected += 1
+            raise RateLimitExceeded(f"SleepIQ rate limit would delay this request by {wait:.1f}s")
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+    
+    async def acquire(self, account=None, priority=False):
+        """Wait until both the account's and the global bucket allow another request.
+        
+        Priority requests, such as a user's manual adjustment, still respect their account's
+        limit but jump the global queue; the token they take delays queued requests instead.
+        """
+        self.requests += 1
+        waited = 0.0
+        
+        # Take the account's token first so one busy account doesn't hold global tokens while it waits
+        bucket = self._account_bucket(account, time.monotonic())
+        if bucket is not None:
+            waited += await self._wait_for(bucket)
+        if self.bucket is not None:
+            if priority:
+                self.priority_requests += 1
+                self.bucket.reserve(time.monotonic())
+            else:
+                waited += await self._wait_for(self.bucket)
+        
+        if waited > 0:
+            self.delayed += 1
+            self.total_wait += waited
+            self.max_waited = max(self.max_waited, waited)
+        return waited
+    
+    def stats(self):
+        """Get limiter settings and wait-time counters"""
+        return {
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'account_rate_per_second': self.account_rate,
+            'account_burst': self.account_burst,
+            'tracked_accounts': len(self.accounts),
+            'requests': self.requests,
+            'priority_requests': self.priority_requests,
+            'delayed': self.delayed,
+            'rejected': self.rejected,
+            'total_wait_seconds': round(self.total_wait, 3),
+            'avg_wait_seconds': round(self.total_wait / self.delayed, 3) if self.delayed else 0.0,
+            'max_wait_seconds': round(self.max_waited, 3)
+        }
@@ -0,0 +1,96 @@
+from models.database import db, AdjustmentLog, AdjustmentDailyStat
+from services.adjustment_stats import adjustment_stats_service
+from datetime import datetime, timedelta
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LogRetentionService:
+    """Deletes expired adjustment logs in small batches so the table never locks for long"""
+    
+    def __init__(self):
+        self.retention_days = int(os.environ.get('LOG_RETENTION_DAYS', 90))
+        self.batch_size = int(os.environ.get('LOG_RETENTION_BATCH_SIZE', 1000))
+        self.batch_pause = float(os.environ.get('LOG_RETENTION_BATCH_PAUSE', 0.1))
+        self.max_seconds = float(os.environ.get('LOG_RETENTION_MAX_SECONDS', 300))
+        self.hour = int(os.environ.get('LOG_RETENTION_HOUR', 3))  # UTC hour of the daily run
+        self.last_run = None
+    
+    def delete_older_than(self, cutoff, user_id=None, pause=0, deadline=None):
+        """Delete logs executed before cutoff one batch per transaction, returning the number removed"""
+        deleted = 0
+        while True:
+            query = db.session.query(
+                AdjustmentLog.id,
+                AdjustmentLog.user_id,
+                AdjustmentLog.executed_at,
+                AdjustmentLog.side,
+                AdjustmentLog.status
+            ).filter(AdjustmentLog.executed_at < cutoff)
+            if user_id is not None:
+                query = query.filter(AdjustmentLog.user_id == user_id)
+            
+            # Oldest rows have the lowest ids, so walking the primary key finds them first
+            rows = [row._asdict() for row in query.order_by(AdjustmentLog.id).limit(self.batch_size)]
+            if not rows:
+                break
+            
+            ids = [row['id'] for row in rows]
+            deleted += AdjustmentLog.query.filter(AdjustmentLog.id.in_(ids)).delete(synchronize_session=False)
+            self._remove_from_stats(rows)
+            db.session.commit()
+            
+            if len(ids) < self.batch_size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(f"Log retention stopped at its time budget with {deleted} rows removed")
+                break
+            if pause:
+                time.sleep(pause)
+        
+        return deleted
+    
+    def _remove_from_stats(self, rows):
+        """Take deleted logs out of the daily counts in the same transaction"""
+        adjustment_stats_service.record(rows, delta=-1)
+        # Emptied days would otherwise still report their last_executed_at
+        db.session.query(AdjustmentDailyStat).filter(
+            AdjustmentDailyStat.user_id.in_({row['user_id'] for row in rows}),
+            AdjustmentDailyStat.count <= 0
+        ).delete(synchronize_session=False)
+    
+    def run(self):
+        """Apply the retention policy to every user's logs"""
+        if self.retention_days <= 0:
+            return None
+        
+        started = time.monotonic()
+        started_at = datetime.utcnow()
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        try:
+            deleted = self.delete_older_than(
+                cutoff,
+                pause=self.batch_pause,
+                deadline=started + self.max_seconds
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Log retention error: {str(e)}")
+            deleted = None
+        
+        duration = time.monotonic() - started
+        self.last_run = {
+            'started_at': started_at.isoformat(),
+            'cutoff': cutoff.isoformat(),
+            'rows_removed': deleted,
+            'duration_seconds': round(duration, 3)
+        }
+        
+        if deleted is not None:
+            logger.info(f"Log retention removed {deleted} logs older than {self.retention_days} days in {duration:.2f}s")
+        return self.last_run
+
+# Global service instance
+log_retention_service = LogRetentionService()
@@ -0,0 +1,161 @@
+from models.database import db, AdjustmentLog, AdjustmentRetry
+from services.sleepiq_service import sleepiq_service
+from services.log_writer import adjustment_log_writer
+from services.adjustment_stats import adjustment_stats_service
+from services.metrics import metrics
+from datetime import datetime, timedelta
+import asyncio
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AdjustmentRetryQueue:
+    """Database-backed queue that retries failed scheduled adjustments with exponential backoff"""
+    
+    def __init__(self):
+        self.base_delay = float(os.environ.get('ADJUSTMENT_RETRY_BASE_SECONDS', 30))
+        self.max_delay = float(os.environ.get('ADJUSTMENT_RETRY_MAX_DELAY_SECONDS', 600))
+        self.max_attempts = int(os.environ.get('ADJUSTMENT_RETRY_MAX_ATTEMPTS', 8))
+        self.max_age = timedelta(minutes=float(os.environ.get('ADJUSTMENT_RETRY_MAX_AGE_MINUTES', 30)))
+        self.batch_size = int(os.environ.get('ADJUSTMENT_RETRY_BATCH_SIZE', 200))
+        self.poll_seconds = float(os.environ.get('ADJUSTMENT_RETRY_POLL_SECONDS', 15))
+        self.max_concurrency = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', 20))
+        self.last_run = None
+    
+    def _backoff(self, attempts):
+        """Delay before the next attempt: exponential in attempts, capped, with jitter"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempts - 1, 0)))
+        # Jitter keeps retries for a failed minute from hitting the upstream together again
+        return timedelta(seconds=random.uniform(delay / 2, delay))
+    
+    def enqueue(self, entries):
+        """Log failed adjustments as pending and queue them for retry, in one transaction"""
+        if not entries:
+            return []
+        
+        now = datetime.utcnow()
+        pending = [dict(entry, status='pending') for entry in entries]
+        logs = adjustment_log_writer.write(pending, commit=False)
+        for log in logs:
+            db.session.add(AdjustmentRetry(
+                log_id=log.id,
+                user_id=log.user_id,
+                side=log.side,
+                firmness=log.firmness,
+                attempts=1,
+                next_attempt_at=now + self._backoff(1),
+                expires_at=(log.executed_at or now) + self.max_age,
+                last_error=log.error_message
+            ))
+        db.session.commit()
+        return logs
+    
+    def _finish(self, retry, status, error_message=None):
+        """Move the retry's log from pending to its final status and drop the retry, returning the row to count"""
+        log = retry.log
+        if log is not None:
+            adjustment_stats_service.record([self._stat_row(log)], delta=-1)
+            log.status = status
+            log.error_message = error_message
+            adjustment_stats_service.record([self._stat_row(log)])
+        db.session.delete(retry)
+        return {'status': status}
+    
+    def _stat_row(self, log):
+        return {'user_id': log.user_id, 'executed_at': log.executed_at, 'side': log.side, 'status': log.status}
+    
+    def _superseded(self, retry):
+        """Check whether a newer adjustment was made to the same side after this one"""
+        return db.session.query(
+            AdjustmentLog.query.filter(
+                AdjustmentLog.user_id == retry.user_id,
+                AdjustmentLog.side == retry.side,
+                AdjustmentLog.executed_at > retry.log.executed_at,
+                AdjustmentLog.id != retry.log_id
+            ).exists()
+        ).scalar()
+    
+    def process(self):
+        """Attempt every retry that is due, returning counts by outcome"""
+        now = datetime.utcnow()
+        retries = AdjustmentRetry.query.filter(
+            AdjustmentRetry.next_attempt_at <= now
+        ).order_by(AdjustmentRetry.next_attempt_at).limit(self.batch_size).all()
+        
+        counts = {'succeeded': 0, 'rescheduled': 0, 'failed': 0, 'expired': 0, 'superseded': 0, 'deferred': 0}
+        attempts = []
+        finished = []  # final outcomes, counted in metrics once committed
+        for retry in retries:
+            if retry.log is None or retry.log.status != 'pending':
+                db.session.delete(retry)
+            elif retry.expires_at <= now:
+                finished.append(self._finish(retry, 'failed', f"Retry window expired: {retry.last_error}"))
+                counts['expired'] += 1
+            elif self._superseded(retry):
+                finished.append(self._finish(retry, 'failed', f"Superseded by a newer adjustment: {retry.last_error}"))
+                counts['superseded'] += 1
+            else:
+                attempts.append(retry)
+        db.session.commit()
+        metrics.count_adjustments(finished, source='retry')
+        finished = []
+        
+        # Leave due retries in place while SleepIQ's circuit is open; they keep expiring on schedule
+        if attempts and sleepiq_service.breaker.is_open():
+            counts['deferred'] = len(attempts)
+            attempts = []
+        
+        if attempts:
+            errors = self._attempt(attempts)
+            for retry in attempts:
+                error = errors.get(retry.id)
+                if error is None:
+                    finished.append(self._finish(retry, 'success'))
+                    counts['succeeded'] += 1
+                elif retry.attempts + 1 >= self.max_attempts:
+                    finished.append(self._finish(retry, 'failed', f"Gave up after {retry.attempts + 1} attempts: {error}"))
+                    counts['failed'] += 1
+                else:
+                    retry.attempts += 1
+                    retry.last_error = error
+                    retry.next_attempt_at = datetime.utcnow() + self._backoff(retry.attempts)
+                    counts['rescheduled'] += 1
+            db.session.commit()
+            metrics.count_adjustments(finished, source='retry')
+        
+        self.last_run = dict(counts, started_at=now.isoformat())
+        if any(counts.values()):
+            logger.info(f"Adjustment retries: {counts}")
+        return counts
+    
+    def _attempt(self, retries):
+        """Retry adjustments on the SleepIQ event loop, returning {retry id: error message} for failures"""
+        # Plain values only, since the event loop thread must not lazy load from the session
+        jobs = [(retry.id, retry.user_id, retry.side, retry.firmness) for retry in retries]
+        sessions, login_errors = sleepiq_service.prepare_sessions(user_id for _, user_id, _, _ in jobs)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def attempt(retry_id, user_id, side, firmness):
+            if user_id in login_errors:
+                return retry_id, login_errors[user_id]
+            async with semaphore:
+                errors = await sleepiq_service.aset_sides(user_id, {side: firmness}, sessions[user_id])
+            return retry_id, errors.get(side)
+        
+        async def attempt_all():
+            return await asyncio.gather(*(attempt(*job) for job in jobs))
+        
+        return {
+            retry_id: error
+            for retry_id, error in sleepiq_service.run(attempt_all())
+            if error is not None
+        }
+    
+    def pending(self):
+        """Number of adjustments waiting to be retried"""
+        return AdjustmentRetry.query.count()
+
+# Global queue instance
+adjustment_retry_queue = AdjustmentRetryQueue()
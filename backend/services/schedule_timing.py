@@ -0,0 +1,52 @@
+from models.database import db, User
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import os
+
+DEFAULT_TIMEZONE = os.environ.get('DEFAULT_TIMEZONE', 'UTC')
+
+def get_zone(name):
+    """Resolve an IANA timezone name, falling back to DEFAULT_TIMEZONE for users without one"""
+    return ZoneInfo(name or DEFAULT_TIMEZONE)
+
+def is_valid_timezone(name):
+    """Check that a timezone name is known to the tz database"""
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+def next_run_at(time_str, days_of_week, tz_name, after=None):
+    """Get the next naive UTC time strictly after `after` when a local "HH:MM" schedule fires"""
+    after = after or datetime.utcnow()
+    zone = get_zone(tz_name)
+    hours, minutes = (int(part) for part in time_str.split(':'))
+    local_day = after.replace(tzinfo=timezone.utc).astimezone(zone).date()
+    
+    # One extra day covers a time that already passed today on a schedule running once a week
+    for offset in range(8):
+        day = local_day + timedelta(days=offset)
+        if days_of_week and day.weekday() not in days_of_week:
+            continue
+        
+        # fold=0 picks the first of two repeated times when clocks go back, and a
+        # time skipped when clocks go forward lands the length of the gap later
+        local = datetime(day.year, day.month, day.day, hours, minutes, tzinfo=zone)
+        candidate = local.astimezone(timezone.utc).replace(tzinfo=None)
+        if candidate > after:
+            return candidate
+    
+    return None
+
+def refresh_next_run(schedule, tz_name=None, after=None):
+    """Recompute a schedule's next_run_at from its time, days and its user's timezone"""
+    # enabled is still None on a new schedule until its column default is applied at flush
+    if schedule.enabled is False:
+        schedule.next_run_at = None
+        return None
+    
+    if tz_name is None:
+        tz_name = db.session.query(User.timezone).filter_by(id=schedule.user_id).scalar()
+    schedule.next_run_at = next_run_at(schedule.time, schedule.days_of_week, tz_name, after)
+    return schedule.next_run_at
@@ -1,25 +1,81 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.base import BaseTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
-from models.database import db, Schedule
+from models.database import db, Schedule, User
 from services.sleepiq_service import sleepiq_service
-from datetime import datetime
+from services.circuit_breaker import CircuitOpenError
+from services.schedule_timing import next_run_at, refresh_next_run
+from services.log_writer import adjustment_log_writer
+from services.retention_service import log_retention_service
+from services.retry_queue import adjustment_retry_queue
+from services.leader_election import LeaderLease
+from services.metrics import metrics
+from sqlalchemy import func, bindparam
+from datetime import datetime, timedelta, timezone
+from contextlib import nullcontext
+import asyncio
+import os
+import time
 import logging
 import atexit
 
 logger = logging.getLogger(__name__)
 
+class DueScheduleTrigger(BaseTrigger):
+    """Fires at the earliest next_run_at of any enabled schedule"""
+    
+    def __init__(self, next_due):
+        self.next_due = next_due  # callable returning the earliest next_run_at as aware UTC, or None
+    
+    def get_next_fire_time(self, previous_fire_time, now):
+        earliest = self.next_due()
+        if earliest is None:
+            return None
+        
+        # Overdue schedules are only advanced once the run completes, so step past the last
+        # fire time rather than returning it again
+        if previous_fire_time is not None:
+            return max(earliest, previous_fire_time + timedelta(minutes=1))
+        return max(earliest, now)
+    
+    def __str__(self):
+        return 'next due schedule'
+
 class SchedulerService:
     def __init__(self):
         self.scheduler = None
         self.is_running = False
+        self.app = None
+        self.max_concurrency = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', 20))
+        self.last_tick = None
+        
+        # Only the process holding this lease dispatches schedules
+        self.lease = LeaderLease('schedule-dispatcher')
+        self.lease_renew_seconds = float(os.environ.get('SCHEDULER_LEASE_RENEW_SECONDS', 10))
+        self.dispatch_trigger = DueScheduleTrigger(self._earliest_due)
+        self.dispatching = False  # set while a tick runs, before its schedules are advanced
+        
+        # Window over which a busy minute's adjustments are spread; capped so all land inside the minute
+        self.spread_seconds = min(float(os.environ.get('SCHEDULER_SPREAD_SECONDS', 45)), 59)
+        
+        # How late a schedule may still run when the dispatcher fell behind
+        self.catchup_minutes = int(os.environ.get('SCHEDULER_CATCHUP_MINUTES', 15))
+        
+        # How far ahead users with upcoming schedules are logged in, so fire time only pays for the adjustment
+        self.prewarm_minutes = float(os.environ.get('SCHEDULER_PREWARM_MINUTES', 5))
+        self.last_prewarm = None
     
-    def start(self):
+    def start(self, app=None):
         """Start the scheduler service"""
         if self.is_running:
             logger.warning("Scheduler is already running")
             return
         
+        self.app = app
+        adjustment_log_writer.start(app)
+        
         # Configure scheduler
         executors = {
             'default': ThreadPoolExecutor(max_workers=5)
@@ -37,15 +93,51 @@ class SchedulerService:
             timezone='UTC'
         )
         
-        # Add the main job that checks schedules every minute
+        # Renew the dispatcher lease, taking over when the current leader's lease expires
         self.scheduler.add_job(
-            func=self.check_and_execute_schedules,
-            trigger=CronTrigger(second=0),  # Run at the start of every minute
-            id='schedule_checker',
-            name='Check and execute schedules',
+            func=self.renew_leadership,
+            trigger=IntervalTrigger(seconds=self.lease_renew_seconds),
+            id='leader_lease',
+            name='Renew scheduler leader lease',
+            replace_existing=True,
+            next_run_time=datetime.now(timezone.utc)
+        )
+        
+        # Add the main job, which only wakes when a schedule is due.
+        # It stays paused until this process holds the lease.
+        self._add_dispatch_job(next_run_time=None)
+        
+        # Retry failed scheduled adjustments with backoff
+        self.scheduler.add_job(
+            func=self.run_adjustment_retries,
+            trigger=IntervalTrigger(seconds=adjustment_retry_queue.poll_seconds),
+            id='adjustment_retries',
+            name='Retry failed adjustments',
             replace_existing=True
         )
         
+        # Log in users shortly before their schedules fire
+        if self.prewarm_minutes > 0:
+            self.scheduler.add_job(
+                func=self.prewarm_sessions,
+                trigger=IntervalTrigger(minutes=1),
+                id='session_prewarm',
+                name='Log in users with upcoming schedules',
+                replace_existing=True,
+                next_run_time=datetime.now(timezone.utc)
+            )
+        
+        # Prune expired adjustment logs once a day
+        if log_retention_service.retention_days > 0:
+            self.scheduler.add_job(
+                func=self.run_log_retention,
+                trigger=CronTrigger(hour=log_retention_service.hour, minute=30),
+                id='log_retention',
+                name='Delete expired adjustment logs',
+                replace_existing=True,
+                misfire_grace_time=3600
+            )
+        
         # Start the scheduler
         self.scheduler.start()
         self.is_running = True
@@ -59,93 +151,440 @@ class SchedulerService:
         """Shutdown the scheduler service"""
         if self.scheduler and self.is_running:
             self.scheduler.shutdown()
+            adjustment_log_writer.stop()
+            with self._app_context():
+                self.lease.release()
             self.is_running = False
             logger.info("Scheduler service stopped")
     
+    def _app_context(self):
+        """Application context for work running outside a request"""
+        return self.app.app_context() if self.app else nullcontext()
+    
+    def _ensure_leader(self):
+        """Renew the dispatcher lease, filling in missing next run times when we first take it"""
+        was_leader = self.lease.is_leader
+        if not self.lease.try_acquire():
+            return False
+        
+        if not was_leader:
+            self._fill_missing_next_runs()
+        return True
+    
+    def _fill_missing_next_runs(self):
+        """Compute next_run_at for enabled schedules saved without one, e.g. after upgrade-schema added the column"""
+        rows = db.session.query(Schedule, User.timezone).join(User, Schedule.user_id == User.id).filter(
+            Schedule.enabled.is_(True),
+            Schedule.next_run_at.is_(None)
+        ).all()
+        if not rows:
+            return
+        
+        for schedule, tz_name in rows:
+            try:
+                refresh_next_run(schedule, tz_name)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Cannot compute next run for schedule {schedule.id}: {str(e)}")
+        db.session.commit()
+        logger.info(f"Computed next run times for {len(rows)} schedules")
+    
+    def _earliest_due(self):
+        """Earliest next_run_at of any enabled schedule, as aware UTC"""
+        try:
+            with self._app_context():
+                earliest = db.session.query(func.min(Schedule.next_run_at)).filter(
+                    Schedule.enabled.is_(True)
+                ).scalar()
+        except Exception as e:
+            # Look again in a minute rather than dropping the dispatcher job
+            logger.error(f"Error finding the next due schedule: {str(e)}")
+            return datetime.now(timezone.utc) + timedelta(minutes=1)
+        return earliest.replace(tzinfo=timezone.utc) if earliest else None
+    
+    def renew_leadership(self):
+        """Heartbeat that keeps or takes over the dispatcher lease"""
+        try:
+            with self._app_context():
+                is_leader = self._ensure_leader()
+            
+            # Also picks up schedules changed through other processes
+            self._reschedule_dispatch(is_leader)
+        except Exception as e:
+            logger.error(f"Error renewing scheduler leadership: {str(e)}")
+    
+    def _reschedule_dispatch(self, is_leader=True):
+        """Point the dispatcher job at the next due schedule, or pause it"""
+        if not self.scheduler:
+            return
+        
+        job = self.scheduler.get_job('schedule_checker')
+        if not is_leader:
+            if job is not None and job.next_run_time is not None:
+                job.pause()
+            return
+        
+        # A running tick still shows its own schedules as due; waking for them again would only be
+        # refused by max_instances, and the job's next run was already set when the tick fired
+        if self.dispatching:
+            return
+        
+        next_run_time = self.dispatch_trigger.get_next_fire_time(None, datetime.now(timezone.utc))
+        if job is None:
+            # APScheduler drops the job once its trigger runs out of schedules
+            self._add_dispatch_job(next_run_time)
+            return
+        
+        # Only ever move the wake-up earlier, so a run that is about to fire is never skipped
+        if job.next_run_time is not None and (next_run_time is None or job.next_run_time <= next_run_time):
+            return
+        job.modify(next_run_time=next_run_time)
+    
+    def _add_dispatch_job(self, next_run_time):
+        """Register the schedule dispatcher job, paused when next_run_time is None"""
+        self.scheduler.add_job(
+            func=self.check_and_execute_schedules,
+            trigger=self.dispatch_trigger,
+            id='schedule_checker',
+            name='Check and execute schedules',
+            replace_existing=True,
+            next_run_time=next_run_time,
+            misfire_grace_time=None  # However late it runs, overdue schedules are still picked up
+        )
+    
+    def schedules_changed(self):
+        """Wake the dispatcher earlier if a schedule saved through the API is now due sooner"""
+        if self.lease.is_leader:
+            self._reschedule_dispatch()
+    
+    def prewarm_sessions(self):
+        """Log in users whose schedules are due within the look-ahead window, concurrently and ahead of time"""
+        try:
+            with self._app_context():
+                # Sessions are cached per process, so only the dispatching process warms them
+                if not self.lease.try_acquire() or sleepiq_service.breaker.is_open():
+                    return
+                
+                started = time.monotonic()
+                now = datetime.utcnow()
+                # Never warm more users than the session cache holds, or they would evict each other
+                user_ids = [user_id for user_id, in db.session.query(Schedule.user_id).filter(
+                    Schedule.enabled.is_(True),
+                    Schedule.next_run_at <= now + timedelta(minutes=self.prewarm_minutes)
+                ).distinct().limit(sleepiq_service.sessions.max_size)]
+                
+                # Users with a cached session are just touched, so it stays warm until their schedule fires
+                sessions, login_errors = sleepiq_service.prepare_sessions(user_ids)
+            
+            self.last_prewarm = {
+                'time': now.isoformat(),
+                'users': len(user_ids),
+                'ready': len(sessions),
+                'failed': len(login_errors),
+                'duration_seconds': round(time.monotonic() - started, 3)
+            }
+        except Exception as e:
+            logger.error(f"Error pre-warming SleepIQ sessions: {str(e)}")
+    
+    def run_log_retention(self):
+        """Run the adjustment log retention policy"""
+        with self._app_context():
+            if not self.lease.try_acquire():
+                return
+            log_retention_service.run()
+    
     def check_and_execute_schedules(self):
-        """Check all schedules and execute those that should run now"""
+        """Execute every schedule whose next run time has passed"""
+        self.dispatching = True
         try:
-            current_time = datetime.now()
-            current_minute = current_time.strftime('%H:%M')
-            current_weekday = current_time.weekday()  # 0=Monday, 6=Sunday
+            tick_started = time.monotonic()
+            now = datetime.utcnow()
             
-            logger.debug(f"Checking schedules at {current_minute} (weekday: {current_weekday})")
+            with self._app_context():
+                # Only the lease holder dispatches, so each schedule fires once across processes
+                if not self._ensure_leader():
+                    return
+                
+                rows = db.session.query(Schedule, User.timezone).join(User, Schedule.user_id == User.id).filter(
+                    Schedule.enabled.is_(True),
+                    Schedule.next_run_at <= now
+                ).order_by(Schedule.next_run_at).all()
+                if not rows:
+                    return
+                
+                due, advances = self._plan_runs(rows, now)
+                
+                # While SleepIQ's circuit is open, the whole tick goes straight to the retry queue
+                deferral = self._upstream_deferral()
+                user_ids = list(dict.fromkeys(schedule.user_id for schedule, _ in due))
+                
+                # Log in any users without a cached session up front
+                if deferral is None:
+                    sessions, login_errors = sleepiq_service.prepare_sessions(user_ids)
+                else:
+                    sessions, login_errors = {}, {user_id: deferral for user_id in user_ids}
+                
+                # Plan only once logins are done, since they go through the same rate limit as the adjustments
+                reachable = [(schedule, scheduled_at) for schedule, scheduled_at in due if schedule.user_id not in login_errors]
+                planned, spread_window = self._spread(reachable, datetime.utcnow())
+                planned += [
+                    (schedule, scheduled_at, scheduled_at)
+                    for schedule, scheduled_at in due
+                    if schedule.user_id in login_errors
+                ]
+                
+                # Group by user so one household's adjustments stay serialized
+                by_user = {}
+                for schedule, scheduled_at, planned_at in planned:
+                    by_user.setdefault(schedule.user_id, []).append((schedule, scheduled_at, planned_at))
             
-            # Get all enabled schedules
-            schedules = Schedule.query.filter_by(enabled=True).all()
+            # Fan out across users on the SleepIQ event loop
+            outcomes = sleepiq_service.run(self._dispatch(by_user, sessions, login_errors))
             
+            start_lags = []
+            drifts = []
+            log_entries = []
+            retry_entries = []
             executed_count = 0
+            failed_count = 0
+            for schedule, sides, errors, planned_offset, lag, executed_at in outcomes:
+                start_lags.append(lag)
+                drifts.append(lag - planned_offset)
+                if errors:
+                    failed_count += 1
+                else:
+                    executed_count += 1
+                
+                for side, firmness in sides.items():
+                    if side in errors:
+                        logger.error(f"Failed to set {side} side to {firmness} for schedule '{schedule.name}': {errors[side]}")
+                    else:
+                        logger.info(f"Successfully set {side} side to {firmness} for schedule '{schedule.name}'")
+                    
+                    entry = {
+                        'user_id': schedule.user_id,
+                        'schedule_id': schedule.id,
+                        'side': side,
+                        'firmness': firmness,
+                        'status': 'failed' if side in errors else 'success',
+                        'error_message': errors.get(side),
+                        'executed_at': executed_at
+                    }
+                    (retry_entries if side in errors else log_entries).append(entry)
+            
+            # Logs are buffered and bulk inserted in the background
+            adjustment_log_writer.add(log_entries)
+            
+            # Failed sides are logged as pending and retried later
+            self._queue_retries(retry_entries)
             
-            for schedule in schedules:
-                try:
-                    # Check if schedule should run now
-                    if self.should_execute_schedule(schedule, current_minute, current_weekday):
-                        logger.info(f"Executing schedule '{schedule.name}' for user {schedule.user_id}")
-                        
-                        # Execute the schedule
-                        self.execute_schedule(schedule)
-                        executed_count += 1
-                        
-                except Exception as e:
-                    logger.error(f"Error executing schedule '{schedule.name}': {str(e)}")
-                    continue
-            
-            if executed_count > 0:
-                logger.info(f"Executed {executed_count} schedules")
+            # Advance only after dispatching, so a crash mid-tick repeats schedules rather than dropping them
+            with self._app_context():
+                self._advance_schedules(advances)
             
+            self._record_tick(now, tick_started, len(due), executed_count, failed_count, start_lags, spread_window, drifts)
+        
         except Exception as e:
             logger.error(f"Error in schedule checker: {str(e)}")
+        finally:
+            self.dispatching = False
     
-    def should_execute_schedule(self, schedule, current_minute, current_weekday):
-        """Check if a schedule should execute now"""
-        # Check time match
-        if schedule.time != current_minute:
-            return False
+    def _upstream_deferral(self):
+        """Error message to defer adjustments with while the SleepIQ circuit is open, or None"""
+        try:
+            sleepiq_service.breaker.check()
+        except CircuitOpenError as e:
+            logger.warning(f"Deferring due schedules to the retry queue: {str(e)}")
+            return f"Deferred: {str(e)}"
+        return None
+    
+    def _queue_retries(self, entries):
+        """Put failed adjustments on the retry queue, logging them as failed if that is not possible"""
+        if not entries:
+            return
         
-        # Check if schedule should run today
-        return schedule.should_run_today()
+        try:
+            with self._app_context():
+                adjustment_retry_queue.enqueue(entries)
+        except Exception as e:
+            with self._app_context():
+                db.session.rollback()
+            logger.error(f"Failed to queue {len(entries)} adjustments for retry: {str(e)}")
+            adjustment_log_writer.add(entries)
     
-    def execute_schedule(self, schedule):
-        """Execute a specific schedule"""
+    def run_adjustment_retries(self):
+        """Retry failed scheduled adjustments that are due"""
         try:
-            user_id = schedule.user_id
+            with self._app_context():
+                if not self.lease.try_acquire():
+                    return
+                adjustment_retry_queue.process()
+        except Exception as e:
+            logger.error(f"Error retrying adjustments: {str(e)}")
+    
+    def _plan_runs(self, rows, now):
+        """Split overdue schedules into ones to run and ones too late to run, with each one's next run time"""
+        # A schedule always gets its own minute, plus the catch-up window
+        oldest = now - timedelta(minutes=self.catchup_minutes + 1)
+        due = []
+        advances = []
+        skipped = 0
+        for schedule, tz_name in rows:
+            scheduled_at = schedule.next_run_at
+            try:
+                next_run = next_run_at(schedule.time, schedule.days_of_week, tz_name, after=now)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Cannot compute next run for schedule {schedule.id}: {str(e)}")
+                next_run = None
+            advances.append({'b_id': schedule.id, 'b_scheduled_at': scheduled_at, 'b_next_run_at': next_run})
+            
+            if scheduled_at < oldest:
+                skipped += 1
+                continue
+            due.append((schedule, scheduled_at))
+        
+        if skipped:
+            logger.warning(
+                f"Skipped {skipped} schedules more than {self.catchup_minutes} minutes overdue; "
+                f"they will run at their next time"
+            )
+        return due, advances
+    
+    def _advance_schedules(self, advances):
+        """Move dispatched schedules to their next run, unless they were edited meanwhile"""
+        table = Schedule.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('b_id'))
+            .where(table.c.next_run_at == bindparam('b_scheduled_at'))
+            .values(next_run_at=bindparam('b_next_run_at'), updated_at=table.c.updated_at),
+            advances
+        )
+        db.session.commit()
+    
+    def _spread(self, due, start):
+        """Plan start times from start that spread each minute's adjustments evenly, as (schedule, scheduled_at, planned_at)"""
+        by_minute = {}
+        for schedule, scheduled_at in due:
+            by_minute.setdefault(scheduled_at, []).append(schedule)
+        
+        rate = sleepiq_service.limiter.rate
+        planned = []
+        max_window = 0.0
+        for scheduled_at, schedules in by_minute.items():
+            # Only stretch a minute as far as the upstream rate needs, so quiet minutes still run at once
+            adjustments = sum(len(self._schedule_sides(schedule)) for schedule in schedules)
+            window = min(self.spread_seconds, adjustments / rate) if rate > 0 else self.spread_seconds
             
-            # Determine which sides to adjust
-            sides_to_adjust = []
-            if schedule.apply_to_sides in ['left', 'both'] and schedule.left_firmness is not None:
-                sides_to_adjust.append(('left', schedule.left_firmness))
-            
-            if schedule.apply_to_sides in ['right', 'both'] and schedule.right_firmness is not None:
-                sides_to_adjust.append(('right', schedule.right_firmness))
-            
-            # Execute adjustments
-            results = {}
-            for side, firmness in sides_to_adjust:
-                try:
-                    result = sleepiq_service.set_firmness(
-                        user_id=user_id,
-                        side=side,
-                        firmness=firmness,
-                        schedule_id=schedule.id
+            # A late start squeezes the plan into what is left of the window rather than running past the minute
+            begin = max(scheduled_at, start)
+            remaining = (scheduled_at + timedelta(seconds=self.spread_seconds) - begin).total_seconds()
+            window = min(window, max(remaining, 0.0))
+            max_window = max(max_window, window)
+            
+            step = window / len(schedules)
+            for position, schedule in enumerate(schedules):
+                planned.append((schedule, scheduled_at, begin + timedelta(seconds=step * position)))
+        return planned, max_window
+    
+    async def _dispatch(self, by_user, sessions, login_errors):
+        """Run each user's due schedules in order at their planned times, with at most max_concurrency in flight"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def run_user(user_id, schedules):
+            outcomes = []
+            for schedule, scheduled_at, planned_at in schedules:
+                # Wait for the planned slot without holding a concurrency slot; late ticks start at once
+                delay = (planned_at - datetime.utcnow()).total_seconds()
+                if delay > 0 and user_id not in login_errors:
+                    await asyncio.sleep(delay)
+                
+                async with semaphore:
+                    planned_offset = (planned_at - scheduled_at).total_seconds()
+                    lag = (datetime.utcnow() - scheduled_at).total_seconds()
+                    logger.info(
+                        f"Executing schedule '{schedule.name}' for user {user_id} "
+                        f"(planned +{planned_offset:.2f}s, started +{lag:.2f}s)"
                     )
-                    results[side] = result
                     
-                    if result['success']:
-                        logger.info(f"Successfully set {side} side to {firmness} for schedule '{schedule.name}'")
+                    sides = self._schedule_sides(schedule)
+                    if user_id in login_errors:
+                        errors = {side: login_errors[user_id] for side in sides}
                     else:
-                        logger.error(f"Failed to set {side} side to {firmness} for schedule '{schedule.name}': {result.get('error')}")
-                        
-                except Exception as e:
-                    logger.error(f"Exception setting {side} side for schedule '{schedule.name}': {str(e)}")
-                    results[side] = {
-                        'success': False,
-                        'error': str(e),
-                        'side': side,
-                        'firmness': firmness
-                    }
+                        errors = await sleepiq_service.aset_sides(user_id, sides, sessions[user_id])
+                    
+                    outcomes.append((schedule, sides, errors, planned_offset, lag, datetime.utcnow()))
+            return outcomes
+        
+        groups = await asyncio.gather(*(
+            run_user(user_id, schedules) for user_id, schedules in by_user.items()
+        ))
+        return [outcome for group in groups for outcome in group]
+    
+    def _record_tick(self, tick_time, tick_started, due_count, executed_count, failed_count, start_lags,
+                     spread_window, drifts):
+        """Keep timing for the last tick so fan-out lag and planned-versus-actual starts can be checked"""
+        duration = time.monotonic() - tick_started
+        metrics.tick_duration.observe(duration)
+        for lag in start_lags:
+            metrics.start_lag.observe(lag)
+        
+        self.last_tick = {
+            'time': tick_time.isoformat(),
+            'due': due_count,
+            'executed': executed_count,
+            'failed': failed_count,
+            'duration_seconds': round(duration, 3),
+            'spread_window_seconds': round(spread_window, 3),
+            'max_start_lag_seconds': round(max(start_lags), 3) if start_lags else None,
+            'avg_start_lag_seconds': round(sum(start_lags) / len(start_lags), 3) if start_lags else None,
+            # How much later than planned schedules actually started
+            'max_start_drift_seconds': round(max(drifts), 3) if drifts else None,
+            'avg_start_drift_seconds': round(sum(drifts) / len(drifts), 3) if drifts else None
+        }
+        
+        if executed_count > 0:
+            logger.info(
+                f"Executed {executed_count} schedules ({failed_count} failed) in {duration:.2f}s, "
+                f"max start lag {self.last_tick['max_start_lag_seconds']}s"
+            )
+        
+        if duration >= 60:
+            logger.warning(f"Schedule tick at {tick_time:%H:%M} UTC took {duration:.2f}s, longer than its minute")
+    
+    def _schedule_sides(self, schedule):
+        """Determine which sides a schedule adjusts, as {side: firmness}"""
+        sides = {}
+        if schedule.apply_to_sides in ['left', 'both'] and schedule.left_firmness is not None:
+            sides['left'] = schedule.left_firmness
+        
+        if schedule.apply_to_sides in ['right', 'both'] and schedule.right_firmness is not None:
+            sides['right'] = schedule.right_firmness
+        
+        return sides
+    
+    def execute_schedule(self, schedule):
+        """Execute a specific schedule"""
+        try:
+            user_id = schedule.user_id
             
-            return results
+            sides = self._schedule_sides(schedule)
+            
+            # Adjust both sides concurrently
+            results = sleepiq_service.set_both_sides(
+                user_id=user_id,
+                left_firmness=sides.get('left'),
+                right_firmness=sides.get('right'),
+                schedule_id=schedule.id
+            )
+            
+            for side, result in results.items():
+                if result['success']:
+                    logger.info(f"Successfully set {side} side to {result['firmness']} for schedule '{schedule.name}'")
+                else:
+                    logger.error(f"Failed to set {side} side to {result['firmness']} for schedule '{schedule.name}': {result.get('error')}")
             
+            return results
+        
         except Exception as e:
             logger.error(f"Exception executing schedule '{schedule.name}': {str(e)}")
             raise
@@ -153,7 +592,7 @@ class SchedulerService:
     def get_scheduler_status(self):
         """Get current scheduler status"""
         if not self.scheduler:
-            return {'running': False, 'jobs': []}
+            return {'running': False, 'jobs': [], 'leader': self.lease.status(), 'last_tick': None, 'log_retention': None}
         
         jobs = []
         for job in self.scheduler.get_jobs():
@@ -166,7 +605,31 @@ class SchedulerService:
         
         return {
             'running': self.is_running,
-            'jobs': jobs
+            'jobs': jobs,
+            'max_concurrency': self.max_concurrency,
+            'leader': self.lease.status(),
+            'last_tick': self.last_tick,
+            'next_dispatch': self._next_dispatch(),
+            'session_prewarm': self.last_prewarm,
+            'adjustment_retries': adjustment_retry_queue.last_run,
+            'log_retention': log_retention_service.last_run
+        }
+    
+    def _next_dispatch(self):
+        """When the dispatcher wakes next and which schedules it will run"""
+        job = self.scheduler.get_job('schedule_checker')
+        if job is None or job.next_run_time is None:
+            return None
+        
+        run_time = job.next_run_time.astimezone(timezone.utc).replace(tzinfo=None)
+        with self._app_context():
+            due_count = Schedule.query.filter(
+                Schedule.enabled.is_(True),
+                Schedule.next_run_at <= run_time
+            ).count()
+        return {
+            'run_time': job.next_run_time.isoformat(),
+            'due_schedules': due_count
         }
     
     def add_test_job(self, func, trigger_time):
@@ -187,9 +650,9 @@ class SchedulerService:
 # Global scheduler instance
 scheduler_service = SchedulerService()
 
-def start_scheduler():
+def start_scheduler(app=None):
     """Start the scheduler service"""
-    scheduler_service.start()
+    scheduler_service.start(app)
 
 def get_scheduler_status():
     """Get scheduler status"""
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import time
+
+class SessionCache:
+    """Thread-safe LRU cache whose entries also expire after an idle period"""
+    
+    def __init__(self, max_size=1000, idle_ttl=3600):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.entries = OrderedDict()  # key -> (value, last_used)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        """Get a cached value, refreshing its idle timer, or None if missing or expired"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, last_used = entry
+            if now - last_used > self.idle_ttl:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self.entries[key] = (value, now)
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """Cache a value, evicting the least recently used entries beyond max_size"""
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def pop(self, key):
+        """Remove a cached value, returning it or None"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return entry[0] if entry else None
+    
+    def stats(self):
+        """Get cache size and hit/miss/eviction counters"""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'idle_ttl_seconds': self.idle_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+    
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import threading
+import aiohttp
+import time
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class EventLoopThread:
+    """A single asyncio event loop running in a background thread"""
+    
+    def __init__(self, name='sleepiq-loop'):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def start(self):
+        """Start the loop thread if it isn't running yet"""
+        with self.lock:
+            if self.loop is not None:
+                return self.loop
+            
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+            thread.start()
+            self.loop = loop
+            self.thread = thread
+            return loop
+    
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+    
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+    
+    def stop(self):
+        """Stop the loop and wait for its thread to exit"""
+        with self.lock:
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            self.loop = None
+            self.thread = None
+
+class SleepIQClient:
+    """Asyncio SleepIQ API client sharing one keep-alive connection pool"""
+    
+    def __init__(self, base_url, pool_size=100, keepalive_timeout=30, request_timeout=15, limiter=None, breaker=None):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.limiter = limiter
+        self.breaker = breaker
+        self.http = None
+    
+    def _get_http(self):
+        """Get the shared aiohttp session, creating it on first use"""
+        if self.http is None or self.http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                raise_for_status=True,
+                # Shared by every user, so cookies must not be kept here; they live with each user's session
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+        return self.http
+    
+    def _auth_headers(self, key):
+        return {'Authorization': f"Bearer {key}"}
+    
+    async def _throttle(self, account, priority=False):
+        """Wait for the rate limiter before sending a request for an account"""
+        if self.limiter is not None:
+            await self.limiter.acquire(account, priority)
+    
+    def _upstream_failed(self, error):
+        """Whether an error means SleepIQ itself is unhealthy, rather than this request being rejected"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500 or error.status == 429
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+    
+    async def _request(self, method, path, account, priority=False, with_cookies=False, **kwargs):
+        """Send one request through the circuit breaker and rate limiter, returning the JSON body.
+        
+        With with_cookies, returns (body, {name: value} of the cookies the response set).
+        """
+        if self.breaker is not None:
+            # Fail before queueing on the limiter when the upstream is known to be down
+            self.breaker.check()
+        await self._throttle(account, priority)
+        if self.breaker is not None:
+            self.breaker.before_request()
+        
+        started = time.perf_counter()
+        try:
+            async with self._get_http().request(method, f"{self.base_url}{path}", **kwargs) as response:
+                result = await response.json(content_type=None)
+                cookies = {name: morsel.value for name, morsel in response.cookies.items()}
+        except Exception as e:
+            status = str(e.status) if isinstance(e, aiohttp.ClientResponseError) else type(e).__name__
+            metrics.upstream_duration.labels(path, status).observe(time.perf_counter() - started)
+            if self.breaker is not None:
+                if self._upstream_failed(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            raise
+        
+        metrics.upstream_duration.labels(path, str(response.status)).observe(time.perf_counter() - started)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return (result, cookies) if with_cookies else result
+    
+    async def login(self, email, password, account=None):
+        """Log in to SleepIQ and return (session key, {name: value} of the session cookies)"""
+        login_data = {
+            "login": email,
+            "password": password
+        }
+        
+        login_result, cookies = await self._request(
+            'POST', '/rest/login', account or email, with_cookies=True, json=login_data
+        )
+        
+        if not login_result or not login_result.get('success'):
+            raise ValueError("Login failed")
+        
+        return login_result.get('key', ''), cookies
+    
+    async def _get_json(self, key, path, account=None, priority=False, cookies=None):
+        return await self._request(
+            'GET', path, account or key, priority, headers=self._auth_headers(key), cookies=cookies
+        )
+    
+    async def get_bed_status(self, key, account=None, priority=False, cookies=None):
+        """Fetch bed information and family status concurrently"""
+        beds, bed_family_status = await asyncio.gather(
+            self._get_json(key, '/rest/beds', account, priority, cookies),
+            self._get_json(key, '/rest/bedFamilyStatus', account, priority, cookies)
+        )
+        return {
+            'beds': beds,
+            'bed_family_status': bed_family_status
+        }
+    
+    async def set_firmness(self, key, side, firmness, account=None, priority=False, cookies=None):
+        """Send a firmness change for one side"""
+        # Validate inputs
+        if side not in ['left', 'right']:
+            raise ValueError("Side must be 'left' or 'right'")
+        
+        if not (0 <= firmness <= 100):
+            raise ValueError("Firmness must be between 0 and 100")
+        
+        sleepnumber_data = {
+            "side": side,
+            "sleepNumber": firmness
+        }
+        
+        await self._request(
+            'POST',
+            '/rest/sleepNumber',
+            account or key,
+            priority,
+            json=sleepnumber_data,
+            headers=self._auth_headers(key),
+            cookies=cookies
+        )
+    
+    async def close(self):
+        """Close the shared connection pool"""
+        if self.http is not None and not self.http.closed:
+            await self.http.close()
@@ -1,15 +1,34 @@
 import os
+import time
+import atexit
+import asyncio
 import logging
-import requests
+import aiohttp
 from cryptography.fernet import Fernet
-from models.database import db, MattressCredentials, AdjustmentLog
+from models.database import db, MattressCredentials
+from services.sleepiq_client import SleepIQClient, EventLoopThread
+from services.rate_limiter import RateLimiter
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.session_cache import SessionCache
+from services.log_writer import adjustment_log_writer
+from services.metrics import metrics
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 class SleepIQService:
     def __init__(self):
-        self.sessions = {}  # Cache sessions per user
+        # Cache session keys per user, bounded and expiring when idle
+        self.sessions = SessionCache(
+            max_size=int(os.environ.get('SLEEPIQ_SESSION_CACHE_SIZE', 1000)),
+            idle_ttl=float(os.environ.get('SLEEPIQ_SESSION_IDLE_TTL', 3600))
+        )
+        self.relogins = {}  # user_id -> in-flight re-login task
+        
+        # Short-lived bed status per user; only touched from the client event loop
+        self.status_ttl = float(os.environ.get('SLEEPIQ_STATUS_TTL', 10))
+        self.status_cache = {}  # user_id -> (expires_at, status)
+        self.status_fetches = {}  # user_id -> in-flight status fetch task
         self.encryption_key = os.environ.get('ENCRYPTION_KEY')
         if not self.encryption_key:
             # Generate a new key if none exists (for development)
@@ -29,165 +48,328 @@ class SleepIQService:
             self.encryption_key = Fernet.generate_key()
             self.cipher_suite = Fernet(self.encryption_key)
         
-        self.base_url = "https://prod-api.sleepiq.sleepnumber.com"
+        # Overridable so the service can point at a local stand-in such as tools/fake_sleepiq.py
+        self.base_url = os.environ.get('SLEEPIQ_BASE_URL', "https://prod-api.sleepiq.sleepnumber.com")
+        
+        # Keep upstream traffic under SleepIQ's tolerance, overall and for each account
+        self.limiter = RateLimiter(
+            rate=float(os.environ.get('SLEEPIQ_RATE_LIMIT', 20)),
+            burst=float(os.environ.get('SLEEPIQ_RATE_BURST', 40)),
+            account_rate=float(os.environ.get('SLEEPIQ_ACCOUNT_RATE_LIMIT', 1)),
+            account_burst=float(os.environ.get('SLEEPIQ_ACCOUNT_RATE_BURST', 5)),
+            max_wait=float(os.environ.get('SLEEPIQ_RATE_MAX_WAIT', 60))
+        )
+        
+        # Stop calling SleepIQ while most recent requests are failing, and probe it after a cool-down
+        self.breaker = CircuitBreaker(
+            'SleepNumber service',
+            failure_rate=float(os.environ.get('SLEEPIQ_BREAKER_FAILURE_RATE', 0.5)),
+            min_requests=int(os.environ.get('SLEEPIQ_BREAKER_MIN_REQUESTS', 10)),
+            window_seconds=float(os.environ.get('SLEEPIQ_BREAKER_WINDOW_SECONDS', 60)),
+            open_seconds=float(os.environ.get('SLEEPIQ_BREAKER_OPEN_SECONDS', 30)),
+            probe_requests=int(os.environ.get('SLEEPIQ_BREAKER_PROBE_REQUESTS', 3))
+        )
+        
+        # Async client sharing one keep-alive connection pool, driven from a background event loop
+        self.client = SleepIQClient(
+            self.base_url,
+            pool_size=int(os.environ.get('SLEEPIQ_POOL_SIZE', 100)),
+            keepalive_timeout=float(os.environ.get('SLEEPIQ_KEEPALIVE_SECONDS', 30)),
+            request_timeout=float(os.environ.get('SLEEPIQ_REQUEST_TIMEOUT', 15)),
+            limiter=self.limiter,
+            breaker=self.breaker
+        )
+        self.loop_thread = EventLoopThread()
+        atexit.register(self.close)
+        
+        metrics.session_cache_size.set_function(lambda: len(self.sessions))
+        metrics.circuit_open.set_function(lambda: 1 if self.breaker.is_open() else 0)
+    
+    def run(self, coro):
+        """Run a coroutine on the client event loop and wait for its result"""
+        return self.loop_thread.run(coro)
+    
+    def close(self):
+        """Close the upstream connection pool and stop the event loop"""
+        if self.loop_thread.loop is None:
+            return
+        try:
+            self.run(self.client.close())
+        except Exception as e:
+            logger.warning(f"Error closing SleepIQ connection pool: {str(e)}")
+        self.loop_thread.stop()
+    
+    def _decrypt(self, value):
+        return self.cipher_suite.decrypt(value.encode()).decode()
+    
+    async def _login(self, user_id, encrypted_email, encrypted_password):
+        """Log in with stored credentials and cache the session"""
+        key, cookies = await self.client.login(
+            self._decrypt(encrypted_email), self._decrypt(encrypted_password), account=user_id
+        )
+        
+        # Keep the encrypted credentials so an expired session can log in again without the database
+        session = {
+            'key': key,
+            'cookies': cookies,
+            'encrypted_email': encrypted_email,
+            'encrypted_password': encrypted_password
+        }
+        self.sessions.set(user_id, session)
+        return session
     
     def _get_session(self, user_id):
         """Get or create a SleepIQ session for the user"""
-        if user_id in self.sessions:
-            return self.sessions[user_id]
+        session = self.sessions.get(user_id)
+        if session is not None:
+            return session
         
         # Get encrypted credentials
         credentials = MattressCredentials.query.filter_by(user_id=user_id).first()
         if not credentials:
             raise ValueError("No SleepNumber credentials found for user")
         
-        # Decrypt credentials
-        email = self.cipher_suite.decrypt(credentials.encrypted_email.encode()).decode()
-        password = self.cipher_suite.decrypt(credentials.encrypted_password.encode()).decode()
-        
-        # Create session
-        session = requests.Session()
-        
         # Login and cache session
         try:
-            login_data = {
-                "login": email,
-                "password": password
-            }
-            
-            response = session.post(f"{self.base_url}/rest/login", json=login_data)
-            response.raise_for_status()
-            
-            login_result = response.json()
-            if not login_result.get('success'):
-                raise ValueError("Login failed")
-            
-            # Store session key
-            session.headers.update({
-                'Authorization': f"Bearer {login_result.get('key', '')}"
-            })
-            
-            self.sessions[user_id] = session
+            session = self.run(self._login(user_id, credentials.encrypted_email, credentials.encrypted_password))
             logger.info(f"Successfully logged in SleepIQ session for user {user_id}")
             return session
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Failed to login SleepIQ session for user {user_id}: {str(e)}")
             raise ValueError(f"Failed to authenticate with SleepNumber: {str(e)}")
     
-    def _log_adjustment(self, user_id, schedule_id, side, firmness, status, error_message=None, sleeper_id=None):
-        """Log an adjustment attempt"""
-        log = AdjustmentLog(
-            user_id=user_id,
-            schedule_id=schedule_id,
-            sleeper_id=sleeper_id,
-            side=side,
-            firmness=firmness,
-            status=status,
-            error_message=error_message,
-            executed_at=datetime.utcnow()
+    def prepare_sessions(self, user_ids):
+        """Get a session for every user, logging in uncached ones concurrently, as ({user_id: session}, {user_id: error})"""
+        # Callers hold on to the returned sessions since the cache may evict part of a large batch
+        sessions = {}
+        missing = []
+        for user_id in set(user_ids):
+            session = self.sessions.get(user_id)
+            if session is None:
+                missing.append(user_id)
+            else:
+                sessions[user_id] = session
+        
+        if not missing:
+            return sessions, {}
+        
+        credentials = {
+            row.user_id: (row.encrypted_email, row.encrypted_password)
+            for row in MattressCredentials.query.filter(MattressCredentials.user_id.in_(missing)).all()
+        }
+        
+        errors = {
+            user_id: "No SleepNumber credentials found for user"
+            for user_id in missing if user_id not in credentials
+        }
+        logged_in, login_errors = self.run(self._login_many(credentials))
+        sessions.update(logged_in)
+        errors.update(login_errors)
+        return sessions, errors
+    
+    async def _login_many(self, credentials):
+        """Log in several users at once, caching their sessions"""
+        user_ids = list(credentials)
+        outcomes = await asyncio.gather(
+            *(self._login(user_id, *credentials[user_id]) for user_id in user_ids),
+            return_exceptions=True
         )
-        db.session.add(log)
-        db.session.commit()
-        return log
+        
+        sessions = {}
+        errors = {}
+        for user_id, outcome in zip(user_ids, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Failed to login SleepIQ session for user {user_id}: {str(outcome)}")
+                errors[user_id] = f"Failed to authenticate with SleepNumber: {str(outcome)}"
+            else:
+                sessions[user_id] = outcome
+        
+        if sessions:
+            logger.info(f"Logged in {len(sessions)} SleepIQ sessions")
+        return sessions, errors
+    
+    async def _relogin(self, user_id, stale_session):
+        """Replace a session the upstream rejected, sharing one login between concurrent callers"""
+        current = self.sessions.get(user_id)
+        if current is not None and current['key'] != stale_session['key']:
+            return current
+        
+        task = self.relogins.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._login(
+                user_id, stale_session['encrypted_email'], stale_session['encrypted_password']
+            ))
+            self.relogins[user_id] = task
+            task.add_done_callback(lambda _: self.relogins.pop(user_id, None))
+        return await task
+    
+    async def _call(self, user_id, request, session=None):
+        """Call request(key, cookies) with the user's session, logging in again and retrying once on 401/403"""
+        if session is None:
+            session = self.sessions.get(user_id)
+        if session is None:
+            raise ValueError("No SleepIQ session for user")
+        
+        try:
+            return await request(session['key'], session.get('cookies'))
+        except aiohttp.ClientResponseError as e:
+            if e.status not in (401, 403):
+                raise
+            logger.info(f"SleepIQ session for user {user_id} was rejected ({e.status}), logging in again")
+        
+        session = await self._relogin(user_id, session)
+        return await request(session['key'], session.get('cookies'))
     
     def get_bed_status(self, user_id):
         """Get current bed status and information"""
         try:
             session = self._get_session(user_id)
-            
-            # Get bed information
-            beds_response = session.get(f"{self.base_url}/rest/beds")
-            beds_response.raise_for_status()
-            beds = beds_response.json()
-            
-            family_status_response = session.get(f"{self.base_url}/rest/bedFamilyStatus")
-            family_status_response.raise_for_status()
-            bed_family_status = family_status_response.json()
-            
-            return {
-                'beds': beds,
-                'bed_family_status': bed_family_status,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return self.run(self._get_bed_status(user_id, session))
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Failed to get bed status for user {user_id}: {str(e)}")
             raise ValueError(f"Failed to get bed status: {str(e)}")
     
+    async def _get_bed_status(self, user_id, session):
+        """Serve bed status from the cache, sharing one upstream fetch between concurrent callers"""
+        cached = self.status_cache.get(user_id)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[1]
+            del self.status_cache[user_id]
+        
+        task = self.status_fetches.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_bed_status(user_id, session))
+            self.status_fetches[user_id] = task
+            task.add_done_callback(lambda done: self._finish_status_fetch(user_id, done))
+        return await task
+    
+    async def _fetch_bed_status(self, user_id, session):
+        """Fetch bed information and family status from the upstream"""
+        # Status is only fetched for someone looking at the app, so it goes ahead of scheduled traffic
+        bed_status = await self._call(
+            user_id,
+            lambda key, cookies: self.client.get_bed_status(key, account=user_id, priority=True, cookies=cookies),
+            session
+        )
+        bed_status['timestamp'] = datetime.utcnow().isoformat()
+        
+        # Only cache if the user wasn't adjusted while this fetch was in flight
+        if self.status_ttl > 0 and self.status_fetches.get(user_id) is asyncio.current_task():
+            self._prune_status_cache()
+            self.status_cache[user_id] = (time.monotonic() + self.status_ttl, bed_status)
+        return bed_status
+    
+    def _finish_status_fetch(self, user_id, task):
+        if self.status_fetches.get(user_id) is task:
+            del self.status_fetches[user_id]
+    
+    def _prune_status_cache(self):
+        """Drop expired status entries once the cache grows past the session cache size"""
+        if len(self.status_cache) < self.sessions.max_size:
+            return
+        now = time.monotonic()
+        for user_id in [user_id for user_id, (expires_at, _) in self.status_cache.items() if expires_at <= now]:
+            del self.status_cache[user_id]
+    
+    def _invalidate_bed_status(self, user_id):
+        """Forget cached and in-flight status after the bed was adjusted"""
+        self.status_cache.pop(user_id, None)
+        self.status_fetches.pop(user_id, None)
+    
+    def _adjustment_result(self, log, error_msg=None):
+        """Build the per-side result returned to callers"""
+        result = {
+            'success': error_msg is None,
+            'side': log.side,
+            'firmness': log.firmness,
+            'log_id': log.id,
+            'timestamp': log.executed_at.isoformat()
+        }
+        if error_msg is not None:
+            result['error'] = error_msg
+        return result
+    
     def set_firmness(self, user_id, side, firmness, schedule_id=None, sleeper_id=None):
         """Set mattress firmness for a specific side"""
-        try:
-            session = self._get_session(user_id)
-            
-            # Validate inputs
-            if side not in ['left', 'right']:
-                raise ValueError("Side must be 'left' or 'right'")
-            
-            if not (0 <= firmness <= 100):
-                raise ValueError("Firmness must be between 0 and 100")
-            
-            # Set the firmness using SleepIQ API
-            sleepnumber_data = {
-                "side": side,
-                "sleepNumber": firmness
-            }
-            
-            response = session.post(f"{self.base_url}/rest/sleepNumber", json=sleepnumber_data)
-            response.raise_for_status()
-            
-            # Log successful adjustment
-            log = self._log_adjustment(
-                user_id=user_id,
-                schedule_id=schedule_id,
-                side=side,
-                firmness=firmness,
-                status='success',
-                sleeper_id=sleeper_id
-            )
-            
-            logger.info(f"Successfully set {side} side to {firmness} for user {user_id}")
-            return {
-                'success': True,
-                'side': side,
-                'firmness': firmness,
-                'log_id': log.id,
-                'timestamp': log.executed_at.isoformat()
-            }
-            
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Failed to set firmness for user {user_id}: {error_msg}")
-            
-            # Log failed adjustment
-            log = self._log_adjustment(
-                user_id=user_id,
-                schedule_id=schedule_id,
-                side=side,
-                firmness=firmness,
-                status='failed',
-                error_message=error_msg,
-                sleeper_id=sleeper_id
-            )
-            
-            return {
-                'success': False,
-                'side': side,
-                'firmness': firmness,
-                'error': error_msg,
-                'log_id': log.id,
-                'timestamp': log.executed_at.isoformat()
-            }
+        return self._set_sides(user_id, {side: firmness}, schedule_id, sleeper_id)[side]
     
     def set_both_sides(self, user_id, left_firmness, right_firmness, schedule_id=None):
         """Set firmness for both sides"""
-        results = {}
+        sides = {}
         
         if left_firmness is not None:
-            results['left'] = self.set_firmness(user_id, 'left', left_firmness, schedule_id)
+            sides['left'] = left_firmness
         
         if right_firmness is not None:
-            results['right'] = self.set_firmness(user_id, 'right', right_firmness, schedule_id)
+            sides['right'] = right_firmness
         
-        return results
+        return self._set_sides(user_id, sides, schedule_id)
+    
+    async def aset_sides(self, user_id, sides, session=None, priority=False):
+        """Adjust sides concurrently for a user with a prepared session, returning {side: error message} for failures"""
+        def request(side, firmness):
+            return lambda key, cookies: self.client.set_firmness(
+                key, side, firmness, account=user_id, priority=priority, cookies=cookies
+            )
+        
+        outcomes = await asyncio.gather(
+            *(self._call(user_id, request(side, firmness), session) for side, firmness in sides.items()),
+            return_exceptions=True
+        )
+        
+        if not all(isinstance(outcome, Exception) for outcome in outcomes):
+            self._invalidate_bed_status(user_id)
+        
+        return {
+            side: str(outcome)
+            for side, outcome in zip(sides, outcomes)
+            if isinstance(outcome, Exception)
+        }
+    
+    def _set_sides(self, user_id, sides, schedule_id=None, sleeper_id=None):
+        """Adjust the given sides concurrently and log all attempts together"""
+        if not sides:
+            return {}
+        
+        # Fail fast without logging attempts that could not have reached SleepIQ
+        self.breaker.check()
+        
+        try:
+            session = self._get_session(user_id)
+            # Manual adjustments go ahead of scheduled ones at the rate limiter
+            errors = self.run(self.aset_sides(user_id, sides, session, priority=schedule_id is None))
+        except Exception as e:
+            errors = {side: str(e) for side in sides}
+        
+        for side, firmness in sides.items():
+            if side in errors:
+                logger.error(f"Failed to set firmness for user {user_id}: {errors[side]}")
+            else:
+                logger.info(f"Successfully set {side} side to {firmness} for user {user_id}")
+        
+        # Log every side in one commit; written synchronously so callers get log ids
+        logs = adjustment_log_writer.write([
+            {
+                'user_id': user_id,
+                'schedule_id': schedule_id,
+                'sleeper_id': sleeper_id,
+                'side': side,
+                'firmness': firmness,
+                'status': 'failed' if side in errors else 'success',
+                'error_message': errors.get(side)
+            }
+            for side, firmness in sides.items()
+        ])
+        
+        return {
+            log.side: self._adjustment_result(log, errors.get(log.side))
+            for log in logs
+        }
     
     def store_credentials(self, user_id, email, password):
         """Store encrypted SleepNumber credentials"""
@@ -215,18 +397,13 @@ class SleepIQService:
             
             db.session.commit()
             
-            # Test the credentials by creating a session
-            test_session = requests.Session()
-            login_data = {
-                "login": email,
-                "password": password
-            }
-            
-            response = test_session.post(f"{self.base_url}/rest/login", json=login_data)
-            response.raise_for_status()
+            # Drop any session logged in with the old credentials
+            self.clear_session_cache(user_id)
             
-            login_result = response.json()
-            if not login_result.get('success'):
+            # Test the credentials by logging in
+            try:
+                self.run(self.client.login(email, password, account=user_id))
+            except ValueError:
                 raise ValueError("Login test failed")
             
             logger.info(f"Successfully stored and verified SleepNumber credentials for user {user_id}")
@@ -240,9 +417,20 @@ class SleepIQService:
     
     def clear_session_cache(self, user_id):
         """Clear cached session for a user (useful when credentials change)"""
-        if user_id in self.sessions:
-            del self.sessions[user_id]
+        if self.sessions.pop(user_id) is not None:
             logger.info(f"Cleared SleepIQ session cache for user {user_id}")
+    
+    def get_session_cache_stats(self):
+        """Get session cache size and hit/miss/eviction counters"""
+        return self.sessions.stats()
+    
+    def get_rate_limiter_stats(self):
+        """Get upstream rate limiter settings and wait-time counters"""
+        return self.limiter.stats()
+    
+    def get_circuit_breaker_stats(self):
+        """Get upstream circuit breaker state and recent error rate"""
+        return self.breaker.stats()
 
 # Global service instance
 sleepiq_service = SleepIQService()
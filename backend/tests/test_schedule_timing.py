@@ -0,0 +1,37 @@
+from datetime import datetime
+from services.schedule_timing import next_run_at
+
+CHICAGO = 'America/Chicago'  # clocks go forward on 2026-03-08 and back on 2026-11-01 at 02:00
+
+def test_spring_forward_gap_runs_the_length_of_the_gap_later():
+    # 02:30 never happens on 2026-03-08 in Chicago; it runs at 03:30 CDT instead
+    assert next_run_at('02:30', [], CHICAGO, after=datetime(2026, 3, 8, 0, 0)) == datetime(2026, 3, 8, 8, 30)
+
+def test_spring_forward_gap_keeps_the_next_day_on_time():
+    assert next_run_at('02:30', [], CHICAGO, after=datetime(2026, 3, 8, 8, 30)) == datetime(2026, 3, 9, 7, 30)
+
+def test_fall_back_repeat_runs_on_the_first_occurrence():
+    # 01:30 happens twice on 2026-11-01 in Chicago, first in CDT (06:30 UTC) then in CST (07:30 UTC)
+    assert next_run_at('01:30', [], CHICAGO, after=datetime(2026, 11, 1, 0, 0)) == datetime(2026, 11, 1, 6, 30)
+
+def test_fall_back_repeat_does_not_run_twice():
+    assert next_run_at('01:30', [], CHICAGO, after=datetime(2026, 11, 1, 6, 30)) == datetime(2026, 11, 2, 7, 30)
+
+def test_weekday_is_the_local_day_behind_utc():
+    # Tuesday 00:30 UTC is still Monday 19:30 in Chicago, so a Monday 20:00 schedule fires an hour later
+    assert next_run_at('20:00', [0], CHICAGO, after=datetime(2026, 10, 20, 0, 30)) == datetime(2026, 10, 20, 1, 0)
+
+def test_weekday_is_the_local_day_ahead_of_utc():
+    # Sunday 22:00 UTC is already Monday 07:00 in Tokyo, so a Monday 08:00 schedule fires on Sunday UTC
+    assert next_run_at('08:00', [0], 'Asia/Tokyo', after=datetime(2026, 10, 18, 22, 0)) == datetime(2026, 10, 18, 23, 0)
+
+def test_weekday_rolls_over_to_next_week():
+    # Monday 21:00 in Chicago, after a Monday 20:00 schedule has fired
+    assert next_run_at('20:00', [0], CHICAGO, after=datetime(2026, 10, 20, 2, 0)) == datetime(2026, 10, 27, 1, 0)
+
+def test_after_equal_to_fire_time_gets_the_next_day():
+    assert next_run_at('07:00', [], 'UTC', after=datetime(2026, 10, 16, 7, 0)) == datetime(2026, 10, 17, 7, 0)
+
+def test_after_equal_to_weekly_fire_time_gets_the_next_week():
+    # 2026-10-16 is a Friday
+    assert next_run_at('07:00', [4], 'UTC', after=datetime(2026, 10, 16, 7, 0)) == datetime(2026, 10, 23, 7, 0)
@@ -0,0 +1,33 @@
+from apscheduler.schedulers.background import BackgroundScheduler
+from datetime import datetime, timedelta, timezone
+import pytest
+from services.scheduler_service import SchedulerService, DueScheduleTrigger
+
+@pytest.fixture
+def service():
+    service = SchedulerService()
+    service.scheduler = BackgroundScheduler(timezone='UTC')
+    return service
+
+def add_dispatch_job(service, next_run_time, earliest_due):
+    service.dispatch_trigger = DueScheduleTrigger(lambda: earliest_due)
+    service._add_dispatch_job(next_run_time)
+
+def test_heartbeat_pulls_the_wake_up_earlier_for_a_newly_due_schedule(service):
+    now = datetime.now(timezone.utc)
+    add_dispatch_job(service, now + timedelta(minutes=5), now - timedelta(seconds=30))
+    
+    service._reschedule_dispatch()
+    
+    assert service.scheduler.get_job('schedule_checker').next_run_time <= datetime.now(timezone.utc)
+
+def test_heartbeat_leaves_the_wake_up_alone_while_a_tick_runs(service):
+    now = datetime.now(timezone.utc)
+    next_minute = now + timedelta(minutes=1)
+    # The running tick's own schedules are still due until it advances them
+    add_dispatch_job(service, next_minute, now - timedelta(seconds=30))
+    service.dispatching = True
+    
+    service._reschedule_dispatch()
+    
+    assert service.scheduler.get_job('schedule_checker').next_run_time == next_minute
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+import pytest
+from models.database import Schedule
+from services.scheduler_service import SchedulerService
+from services.sleepiq_service import sleepiq_service
+
+MINUTE = datetime(2026, 10, 16, 22, 0)
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(sleepiq_service.limiter, 'rate', 20.0)
+    service = SchedulerService()
+    service.spread_seconds = 45
+    return service
+
+def due_schedules(count):
+    return [
+        (Schedule(id=i, user_id=i, apply_to_sides='both', left_firmness=40, right_firmness=60), MINUTE)
+        for i in range(count)
+    ]
+
+def test_on_time_start_spreads_over_what_the_rate_needs(service):
+    planned, window = service._spread(due_schedules(100), MINUTE)
+    
+    # 200 adjustments at 20 per second
+    assert window == 10
+    assert planned[0][2] == MINUTE
+    assert planned[-1][2] == MINUTE + timedelta(seconds=10 * 99 / 100)
+
+def test_late_start_is_squeezed_into_the_rest_of_the_window(service):
+    start = MINUTE + timedelta(seconds=20)
+    planned, window = service._spread(due_schedules(450), start)
+    
+    assert window == 25
+    assert planned[0][2] == start
+    assert all(start <= planned_at < MINUTE + timedelta(seconds=45) for _, _, planned_at in planned)
+
+def test_start_after_the_window_runs_everything_at_once(service):
+    start = MINUTE + timedelta(seconds=50)
+    planned, window = service._spread(due_schedules(10), start)
+    
+    assert window == 0
+    assert {planned_at for _, _, planned_at in planned} == {start}
+
+def test_each_minute_is_planned_from_its_own_scheduled_time(service):
+    overdue = [(schedule, MINUTE - timedelta(minutes=1)) for schedule, _ in due_schedules(2)]
+    planned, window = service._spread(overdue + due_schedules(2), MINUTE)
+    
+    # The overdue minute's window has passed, so it starts at once; the current minute still spreads
+    assert [planned_at for _, _, planned_at in planned] == [
+        MINUTE, MINUTE, MINUTE, MINUTE + timedelta(seconds=0.1)
+    ]
@@ -0,0 +1,229 @@
+"""Local stand-in for the SleepIQ API, with latency and fault injection.
+
+Serves /rest/login, /rest/beds, /rest/bedFamilyStatus and /rest/sleepNumber so the backend
+can be load-tested offline. Point the backend at it with SLEEPIQ_BASE_URL:
+
+    python -m tools.fake_sleepiq --port 8765 --latency lognormal:80:0.5 --error-rate 0.01 --rate-limit 50
+    SLEEPIQ_BASE_URL=http://127.0.0.1:8765 python app.py
+
+Request counts, status codes and latency per endpoint are served at /_fake/stats and reset
+with DELETE /_fake/stats.
+"""
+from aiohttp import web
+import argparse
+import asyncio
+import math
+import random
+import secrets
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Latency:
+    """Response delay drawn from a distribution given as 'fixed:MS', 'uniform:MIN_MS:MAX_MS' or 'lognormal:MEDIAN_MS:SIGMA'"""
+    
+    def __init__(self, spec='fixed:0'):
+        kind, *args = spec.split(':')
+        try:
+            values = [float(arg) for arg in args]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        
+        if kind == 'fixed' and len(values) == 1:
+            self.sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self.sample = lambda: random.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2 and values[0] > 0:
+            # The median of a lognormal is e^mu, so mu is the log of the requested median
+            mu = math.log(values[0])
+            self.sample = lambda: random.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.spec = spec
+    
+    async def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+class FakeConfig:
+    """Fault injection settings for the fake server"""
+    
+    def __init__(self, latency=None, error_rate=0.0, throttle_rate=0.0, rate_limit=0.0, session_ttl=0.0,
+                 reject_password='invalid'):
+        self.latency = latency or Latency()
+        self.error_rate = error_rate  # share of requests answered with 500
+        self.throttle_rate = throttle_rate  # share of requests answered with 429
+        self.rate_limit = rate_limit  # requests per second across all clients before answering 429, 0 for no limit
+        self.session_ttl = session_ttl  # seconds before a session key is rejected with 401, 0 to never expire
+        self.reject_password = reject_password  # password whose login fails
+
+class FakeSleepIQ:
+    """In-memory SleepIQ accounts, sessions and beds"""
+    
+    def __init__(self, config=None):
+        self.config = config or FakeConfig()
+        self.sessions = {}  # key -> (login, expires_at)
+        self.beds = {}  # login -> {'left': firmness, 'right': firmness}
+        self.tokens = self.config.rate_limit
+        self.refilled = time.monotonic()
+        self.stats = {}
+    
+    def _record(self, endpoint, status, started):
+        stats = self.stats.setdefault(endpoint, {'requests': 0, 'statuses': {}, 'total_ms': 0.0, 'max_ms': 0.0})
+        elapsed = (time.monotonic() - started) * 1000
+        stats['requests'] += 1
+        stats['statuses'][str(status)] = stats['statuses'].get(str(status), 0) + 1
+        stats['total_ms'] += elapsed
+        stats['max_ms'] = max(stats['max_ms'], elapsed)
+    
+    def _throttled(self):
+        """Whether the global rate limit or the injected 429 rate rejects this request"""
+        if self.config.rate_limit > 0:
+            now = time.monotonic()
+            self.tokens = min(self.config.rate_limit, self.tokens + (now - self.refilled) * self.config.rate_limit)
+            self.refilled = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+        return random.random() < self.config.throttle_rate
+    
+    def _account(self, request):
+        """Login for the request's session key, or None if it is unknown or expired"""
+        key = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+        
+        login, expires_at = session
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.sessions[key]
+            return None
+        return login
+    
+    def _bed(self, login):
+        return self.beds.setdefault(login, {'left': 50, 'right': 50})
+    
+    def _bed_id(self, login):
+        return f"fake-{abs(hash(login)) % 10 ** 8}"
+    
+    def endpoint(self, name, authenticated=True):
+        """Wrap a handler with latency, fault injection, session checks and stats"""
+        def decorator(handler):
+            async def wrapper(request):
+                started = time.monotonic()
+                await self.config.latency.wait()
+                
+                if self._throttled():
+                    response = web.json_response({'error': 'Too many requests'}, status=429)
+                elif random.random() < self.config.error_rate:
+                    response = web.json_response({'error': 'Injected failure'}, status=500)
+                elif authenticated and (login := self._account(request)) is None:
+                    response = web.json_response({'error': 'Session expired'}, status=401)
+                else:
+                    response = await handler(request, login if authenticated else None)
+                
+                self._record(name, response.status, started)
+                return response
+            return wrapper
+        return decorator
+    
+    async def login(self, request, _):
+        data = await request.json()
+        login = data.get('login')
+        if not login or data.get('password') == self.config.reject_password:
+            return web.json_response({'success': False})
+        
+        key = secrets.token_hex(16)
+        expires_at = time.monotonic() + self.config.session_ttl if self.config.session_ttl > 0 else None
+        self.sessions[key] = (login, expires_at)
+        return web.json_response({'success': True, 'key': key, 'userId': login})
+    
+    async def beds_info(self, request, login):
+        return web.json_response({'beds': [{
+            'bedId': self._bed_id(login),
+            'name': 'Fake Bed',
+            'model': 'FAKE',
+            'dualSleep': True
+        }]})
+    
+    async def family_status(self, request, login):
+        bed = self._bed(login)
+        return web.json_response({'beds': [{
+            'bedId': self._bed_id(login),
+            'status': 1,
+            'leftSide': {'isInBed': False, 'sleepNumber': bed['left']},
+            'rightSide': {'isInBed': False, 'sleepNumber': bed['right']}
+        }]})
+    
+    async def sleep_number(self, request, login):
+        data = await request.json()
+        side = data.get('side')
+        firmness = data.get('sleepNumber')
+        if side not in ('left', 'right') or not isinstance(firmness, int) or not (0 <= firmness <= 100):
+            return web.json_response({'error': 'Invalid sleep number'}, status=400)
+        
+        self._bed(login)[side] = firmness
+        return web.json_response({})
+    
+    async def get_stats(self, request):
+        return web.json_response({
+            endpoint: dict(stats, avg_ms=round(stats['total_ms'] / stats['requests'], 3) if stats['requests'] else 0.0)
+            for endpoint, stats in self.stats.items()
+        })
+    
+    async def reset_stats(self, request):
+        self.stats = {}
+        return web.json_response({})
+    
+    def make_app(self):
+        """Build the aiohttp application"""
+        app = web.Application()
+        app.add_routes([
+            web.post('/rest/login', self.endpoint('login', authenticated=False)(self.login)),
+            web.get('/rest/beds', self.endpoint('beds')(self.beds_info)),
+            web.get('/rest/bedFamilyStatus', self.endpoint('bedFamilyStatus')(self.family_status)),
+            web.post('/rest/sleepNumber', self.endpoint('sleepNumber')(self.sleep_number)),
+            web.get('/_fake/stats', self.get_stats),
+            web.delete('/_fake/stats', self.reset_stats)
+        ])
+        return app
+
+async def start_server(config=None, host='127.0.0.1', port=8765):
+    """Start a fake server on the running loop, returning (FakeSleepIQ, AppRunner); call runner.cleanup() to stop it"""
+    fake = FakeSleepIQ(config)
+    runner = web.AppRunner(fake.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return fake, runner
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the SleepIQ API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0',
+                        help="Response delay: fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='Requests per second before answering 429, 0 for no limit')
+    parser.add_argument('--session-ttl', type=float, default=0.0,
+                        help='Seconds before session keys expire with 401, 0 to never expire')
+    parser.add_argument('--reject-password', default='invalid', help='Password whose login fails')
+    args = parser.parse_args()
+    
+    config = FakeConfig(
+        latency=Latency(args.latency),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        session_ttl=args.session_ttl,
+        reject_password=args.reject_password
+    )
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Fake SleepIQ on http://{args.host}:{args.port} with latency {config.latency.spec}")
+    web.run_app(FakeSleepIQ(config).make_app(), host=args.host, port=args.port, print=None)
+
+if __name__ == '__main__':
+    main()